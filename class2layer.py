@@ -1,30 +1,33 @@
 #!/usr/bin/env python
 
 import inkex
-from inkex import Group
-
-def class2layer(svg):
-    layer_list = []
-    xpath_expr = "//*[contains(concat(' ', normalize-space(@class), ' '), ' Ifc')]"
-    elements = svg.xpath(xpath_expr)
-    for element in elements:
-        classes = element.get('class').split()
-        IfcClass = [string for string in classes if string.startswith('Ifc')][0]
-        # inkex.utils.debug(IfcClass)
-        if IfcClass not in layer_list:
-            layer = svg.add(Group(id=IfcClass))
-            layer.set('inkscape:groupmode', 'layer')
-            layer.set('inkscape:label', IfcClass)
-            layer_list.append(IfcClass)
-        else:
-            layer = svg.getElementById(IfcClass)
-        layer.add(element)
-        # inkex.utils.debug(IfcClass)
-    return svg
+from ifc_layers import class2layer, stream_class2layer
 
 class CreateLayersFromClasses(inkex.EffectExtension):
+    def add_arguments(self, pars):
+        pars.add_argument(
+            "--stream", type=inkex.Boolean, default=False,
+            help="Stream the document instead of loading it (headless, for very large drawings)"
+        )
+
+    def load(self, stream):
+        if self.options.stream:
+            # Parsed incrementally in save()
+            return getattr(stream, "buffer", stream)
+        return super().load(stream)
+
     def effect(self):
-        self.svg = class2layer(self.svg)
+        if not self.options.stream:
+            class2layer(self.svg)
+
+    def has_changed(self, ret):
+        return self.options.stream or super().has_changed(ret)
+
+    def save(self, stream):
+        if self.options.stream:
+            stream_class2layer(self.document, stream)
+        else:
+            super().save(stream)
 
 if __name__ == '__main__':
     CreateLayersFromClasses().run()
\ No newline at end of file
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+Binary DXF encoding and compressed containers shared by the DXF exporters.
+
+Binary DXF stores the same group code / value pairs as ASCII DXF: the group
+code as a little-endian 16 bit integer (R13 and later), then the value as a
+zero terminated string, a little-endian integer of the size the group code
+calls for, or an IEEE double.  Values need no formatting or parsing, which
+makes binary files smaller and faster to write and load.
+"""
+
+import gzip
+import os
+import struct
+import zipfile
+from contextlib import contextmanager
+
+SENTINEL = b"AutoCAD Binary DXF\r\n\x1a\x00"
+
+FORMATS = ("ascii", "binary")
+COMPRESSIONS = ("none", "gzip", "zip")
+
+
+def _codes(*ranges):
+    return frozenset(code for start, stop in ranges for code in range(start, stop))
+
+
+BOOL = _codes((290, 300))
+INT16 = _codes((60, 80), (170, 180), (270, 290), (370, 390), (400, 410), (1060, 1071))
+INT32 = _codes((90, 100), (420, 430), (440, 460), (1071, 1072))
+INT64 = _codes((160, 170))
+DOUBLE = _codes((10, 60), (110, 150), (210, 240), (460, 470), (1010, 1060))
+CHUNK = _codes((310, 320), (1004, 1005))
+
+
+def binary_tag(code, value, encoding):
+    """Encode one group code / value pair, value as text or number"""
+    head = struct.pack("<h", code)
+    if code in DOUBLE:
+        return head + struct.pack("<d", float(value))
+    if code in INT16:
+        return head + struct.pack("<h", int(value))
+    if code in INT32:
+        return head + struct.pack("<i", int(value))
+    if code in BOOL:
+        return head + struct.pack("<B", int(value))
+    if code in INT64:
+        return head + struct.pack("<q", int(value))
+    if code in CHUNK:
+        data = bytes.fromhex(value)
+        return head + struct.pack("<B", len(data)) + data
+    return head + value.encode(encoding) + b"\0"
+
+
+# Constant tags of the LINE and LWPOLYLINE entities, around handle and layer
+LINE_START = binary_tag(0, "LINE", "ascii") + struct.pack("<h", 5)
+LWPOLYLINE_START = binary_tag(0, "LWPOLYLINE", "ascii") + struct.pack("<h", 5)
+ENTITY_LAYER = b"\0" + binary_tag(100, "AcDbEntity", "ascii") + struct.pack("<h", 8)
+LINE_SUBCLASS = binary_tag(100, "AcDbLine", "ascii")
+LWPOLYLINE_SUBCLASS = binary_tag(100, "AcDbPolyline", "ascii")
+_color = struct.Struct("<xhh").pack  # end of the layer name, 62 color
+_line_points = struct.Struct("<hdhdhdhdhdhd").pack
+_lwpolyline_counts = struct.Struct("<hihh").pack
+_vertex = struct.Struct("<hdhdhd").pack
+
+
+def binary_line(handle, layer, color, csp, encoding):
+    """LINE entity as binary DXF, the coordinates packed as they are"""
+    return b"".join(
+        (
+            LINE_START, b"%x" % handle, ENTITY_LAYER, layer.encode(encoding),
+            _color(62, color), LINE_SUBCLASS,
+            _line_points(
+                10, csp[0][0], 20, csp[0][1], 30, 0.0, 11, csp[1][0], 21, csp[1][1], 31, 0.0
+            ),
+        )
+    )
+
+
+def binary_lwpolyline(handle, layer, color, points, closed, encoding):
+    """LWPOLYLINE entity as binary DXF, the vertices packed as they are"""
+    head = b"".join(
+        (
+            LWPOLYLINE_START, b"%x" % handle, ENTITY_LAYER, layer.encode(encoding),
+            _color(62, color), LWPOLYLINE_SUBCLASS,
+            _lwpolyline_counts(90, len(points), 70, closed),
+        )
+    )
+    return head + b"".join(_vertex(10, x, 20, y, 30, 0.0) for x, y in points)
+
+
+def ascii_to_binary(text, encoding):
+    """Encode ASCII DXF text made of whole tags as binary DXF tags"""
+    lines = text.split("\n")
+    return b"".join(
+        binary_tag(int(code), value, encoding)
+        for code, value in zip(lines[0:-1:2], lines[1::2])
+        if int(code) != 999  # binary DXF has no comments
+    )
+
+
+def member_name(document_path):
+    """Name of the DXF file inside a zip archive, after the document"""
+    name = os.path.splitext(os.path.basename(document_path or ""))[0]
+    return (name or "drawing") + ".dxf"
+
+
+@contextmanager
+def container(stream, compression="none", name="drawing.dxf"):
+    """Binary stream writing into stream as is, gzip compressed or as the
+    single member of a zip archive. The output stream is left open, no
+    time stamps are stored and both containers store name as the file name
+    (not the one of the stream), so equal input gives equal bytes."""
+    if compression == "gzip":
+        with gzip.GzipFile(name, mode="wb", fileobj=stream, mtime=0) as compressed:
+            yield compressed
+    elif compression == "zip":
+        with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED) as archive:
+            member = zipfile.ZipInfo(name, date_time=(1980, 1, 1, 0, 0, 0))
+            member.compress_type = zipfile.ZIP_DEFLATED
+            with archive.open(member, "w") as compressed:
+                yield compressed
+    else:
+        yield stream
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+Native DXF primitives for circles, ellipses and circular arcs.
+
+Inkscape hands every circle and ellipse to the exporters as four or more
+cubic Bézier segments, and SVG arcs become one Bézier per quarter turn or
+less.  CAD programs expect CIRCLE, ARC and ELLIPSE entities instead, exact and
+one per shape.  ellipse_primitive maps Circle and Ellipse elements under their
+transform, arc_run recognizes consecutive Bézier segments of a superpath that
+lie on one circle.
+
+Primitives are tuples ("CIRCLE", center, radius), ("ARC", center, radius,
+start angle, end angle) with counterclockwise angles in degrees as DXF takes
+them, or ("ELLIPSE", center, major axis, ratio) with the major axis as the
+vector from the center to its end.  Tolerances are relative to the radius.
+"""
+
+import math
+
+from inkex import Circle
+
+TOLERANCE = 0.001  # a quarter circle Bézier is off the circle by 0.00027
+FULL_TURN = 2 * math.pi
+
+
+def ellipse_primitive(node, transform, tolerance=TOLERANCE):
+    """CIRCLE or ELLIPSE of a Circle or Ellipse element under transform, None
+    when the transformed shape degenerates to a point or a line"""
+    if isinstance(node, Circle):
+        rx = ry = node.radius
+    else:
+        rx, ry = node.radius
+    # Conjugate semi-diameters, the ellipse is center + u cos t + v sin t
+    ux, uy = transform.a * rx, transform.b * rx
+    vx, vy = transform.c * ry, transform.d * ry
+    # The major semi-axis is the longest semi-diameter, the minor one a quarter turn on
+    t = 0.5 * math.atan2(2 * (ux * vx + uy * vy), ux * ux + uy * uy - vx * vx - vy * vy)
+    cos, sin = math.cos(t), math.sin(t)
+    major = (ux * cos + vx * sin, uy * cos + vy * sin)
+    a = math.hypot(*major)
+    b = math.hypot(vx * cos - ux * sin, vy * cos - uy * sin)
+    if b <= tolerance * a:
+        return None
+    center = transform.apply_to_point(node.center)
+    if a - b <= tolerance * a:
+        return "CIRCLE", (center.x, center.y), (a + b) / 2
+    return "ELLIPSE", (center.x, center.y), major, b / a
+
+
+def circular_arc(p0, p1, p2, p3, tolerance=TOLERANCE):
+    """Circular arc drawn by the cubic Bézier p0 p1 p2 p3 as (center x,
+    center y, radius, start angle, sweep) in radians, the sweep negative
+    clockwise, None if the Bézier is no circular arc"""
+    t0x, t0y = p1[0] - p0[0], p1[1] - p0[1]
+    t3x, t3y = p3[0] - p2[0], p3[1] - p2[1]
+    cross = t0x * t3y - t0y * t3x
+    if not cross:
+        return None
+    # The center is where the normals at both ends meet
+    s = ((p3[0] - p0[0]) * t3x + (p3[1] - p0[1]) * t3y) / cross
+    if s * cross < 0:  # turning away from the center
+        return None
+    cx, cy = p0[0] - s * t0y, p0[1] + s * t0x
+    radius = math.hypot(p0[0] - cx, p0[1] - cy)
+    limit = tolerance * radius
+    if abs(math.hypot(p3[0] - cx, p3[1] - cy) - radius) > limit:
+        return None
+    start = math.atan2(p0[1] - cy, p0[0] - cx)
+    sweep = math.atan2(cross, t0x * t3x + t0y * t3y)
+    # The middle of the Bézier has to be the middle of the arc, the points
+    # half way to the ends have to be on the circle
+    middle = start + sweep / 2
+    x = (p0[0] + 3 * (p1[0] + p2[0]) + p3[0]) / 8
+    y = (p0[1] + 3 * (p1[1] + p2[1]) + p3[1]) / 8
+    if math.hypot(x - cx - radius * math.cos(middle), y - cy - radius * math.sin(middle)) > limit:
+        return None
+    for u in (0.25, 0.75):
+        w = (1 - u) ** 3, 3 * (1 - u) ** 2 * u, 3 * (1 - u) * u * u, u**3
+        x = w[0] * p0[0] + w[1] * p1[0] + w[2] * p2[0] + w[3] * p3[0]
+        y = w[0] * p0[1] + w[1] * p1[1] + w[2] * p2[1] + w[3] * p3[1]
+        if abs(math.hypot(x - cx, y - cy) - radius) > limit:
+            return None
+    return cx, cy, radius, start, sweep
+
+
+def arc_run(sub, start, tolerance=TOLERANCE):
+    """Circular arc drawn by the Bézier segments of the superpath sub from
+    point start on, as (primitive, stop) with stop the point it ends on, an
+    ARC or, once it turns all the way round, a CIRCLE. None if the segment
+    from point start is no circular arc."""
+    s, e = sub[start], sub[start + 1]
+    arc = circular_arc(s[1], s[2], e[0], e[1], tolerance)
+    if arc is None:
+        return None
+    cx, cy, radius, angle, sweep = arc
+    limit = tolerance * radius
+    stop = start + 1
+    while stop < len(sub) - 1 and abs(sweep) < FULL_TURN - tolerance:
+        s, e = sub[stop], sub[stop + 1]
+        if s[1] == s[2] and e[0] == e[1]:
+            break
+        arc = circular_arc(s[1], s[2], e[0], e[1], tolerance)
+        if (
+            arc is None
+            or abs(arc[0] - cx) > limit
+            or abs(arc[1] - cy) > limit
+            or abs(arc[2] - radius) > limit
+            or (arc[4] > 0) != (sweep > 0)
+            or abs(sweep + arc[4]) > FULL_TURN + tolerance
+        ):
+            break
+        sweep += arc[4]
+        stop += 1
+    if abs(sweep) >= FULL_TURN - tolerance:
+        return ("CIRCLE", (cx, cy), radius), stop
+    if sweep < 0:
+        angle += sweep
+    angle = math.degrees(angle) % 360
+    return ("ARC", (cx, cy), radius, angle, (angle + math.degrees(abs(sweep))) % 360), stop
@@ -52,9 +52,26 @@ from inkex import (
 from inkex.localization import inkex_gettext as _
 
 import ezdxf
+from ezdxf.document import CREATED_BY_EZDXF, WRITTEN_BY_EZDXF
+from ezdxf.lldxf.tagwriter import BinaryTagWriter, TagWriter
+from ezdxf.tools.juliandate import juliandate
 import io
-from uuid import uuid4
-import random
+import os
+import sys
+import hashlib
+import shutil
+import tempfile
+import uuid
+import zlib
+from datetime import datetime
+from ifc_layers import export_layers
+from ifc_diagnostics import Diagnostics
+from dxf_output import container, member_name
+from dxf_primitives import arc_run, ellipse_primitive
+
+# This exporter and the extension modules it imports, the exported bytes
+# depend on all of their code
+LOCAL_MODULES = (__name__, "ifc_layers", "ifc_diagnostics", "dxf_output", "dxf_primitives")
 
 def get_matrix(u, i, j):
     if j == i + 2:
@@ -88,35 +105,67 @@ def get_fit(u, csp, col):
         + u**3 * csp[3][col]
     )
 
-def class2layer(self, svg):
-    layer_list = []
-    xpath_expr = "//*[contains(concat(' ', normalize-space(@class), ' '), ' Ifc')]"
-    elements = svg.xpath(xpath_expr)
-    for element in elements:
-        classes = element.get('class').split()
-        IfcClass = [string for string in classes if string.startswith('Ifc')][0]
-        inkex.utils.debug(IfcClass)
-        if IfcClass not in layer_list:
-            layer = svg.add(Group(id=IfcClass))
-            layer.set('inkscape:groupmode', 'layer')
-            layer.set('inkscape:label', IfcClass)
-            layer_list.append(IfcClass)
-            self.dxf.layers.add(
-                name=IfcClass,
-                color=random.randint(1, 255)
+FIXED_DATE = datetime(2000, 1, 1)  # creation and update date of every export
+EZDXF_SERIES = ((1, 4),)  # ezdxf releases write_document() follows doc.write() of
+
+
+def stamp_header(doc, digest):
+    """Replace the dates, GUIDs and ezdxf markers doc.update_all() takes from
+    the clock and uuid4() by a fixed date and GUIDs from the content hash"""
+    date = juliandate(FIXED_DATE)
+    for name in ("$TDCREATE", "$TDUCREATE", "$TDUPDATE", "$TDUUPDATE"):
+        doc.header[name] = date
+    doc.header["$FINGERPRINTGUID"] = "{%s}" % str(uuid.UUID(digest[:32])).upper()
+    doc.header["$VERSIONGUID"] = "{%s}" % str(uuid.UUID(digest[32:64])).upper()
+    marker = "%s @ %s" % (ezdxf.__version__, FIXED_DATE.isoformat())
+    metadata = doc.ezdxf_metadata()
+    metadata[CREATED_BY_EZDXF] = marker
+    metadata[WRITTEN_BY_EZDXF] = marker
+
+
+def write_document(doc, stream, fmt, digest):
+    """doc.write() with a deterministic header, identical input gives
+    identical bytes"""
+    if ezdxf.version[:2] not in EZDXF_SERIES:
+        # The steps of doc.write() below may change in other releases
+        inkex.errormsg(
+            _("Warning: ezdxf {} is untested, the DXF header is not reproducible").format(
+                ezdxf.__version__
             )
-        else:
-            layer = svg.getElementById(IfcClass)
-        layer.add(element)
-        # inkex.utils.debug(IfcClass)
-    return svg
-
-def to_binary_data(doc):
-    dxf_stream = io.StringIO()
-    doc.write(dxf_stream)
-    dxf_data = dxf_stream.getvalue()
-    dxf_stream.close()
-    return dxf_data.encode()
+        )
+        doc.write(stream, fmt=fmt)
+        return
+    doc.commit_pending_changes()
+    doc.update_all()
+    stamp_header(doc, digest)
+    if fmt == "bin":
+        writer = BinaryTagWriter(stream, doc.dxfversion, encoding=doc.output_encoding)
+        writer.write_signature()
+    else:
+        writer = TagWriter(stream, doc.dxfversion)
+    doc.export_sections(writer)
+
+
+def write_binary_data(doc, stream, digest, dxf_format="ascii", compression="none", name=None):
+    """Encode the DXF document straight into the binary output stream, as
+    ASCII or binary DXF, optionally compressed"""
+    with container(stream, compression, member_name(name)) as output:
+        if dxf_format == "binary":
+            write_document(doc, output, "bin", digest)
+            return
+        dxf_stream = io.TextIOWrapper(
+            output, encoding=doc.output_encoding, errors="dxfreplace", newline=""
+        )
+        try:
+            write_document(doc, dxf_stream, "asc", digest)
+            dxf_stream.flush()
+        finally:
+            # Leave the output stream open for Inkscape
+            dxf_stream.detach()
+
+def layer_color(IfcClass):
+    """Stable ACI colour (1-255) derived from the IfcClass"""
+    return zlib.crc32(IfcClass.encode("utf-8")) % 255 + 1
 
 def get_insert_point(node, mat):
     if not isinstance(node, (PathElement, Rectangle, Line, Circle, Ellipse)):
@@ -137,11 +186,21 @@ class EzDxfExporter(inkex.OutputExtension):
     #     pars.add_argument("--encoding", dest="char_encode", default="latin_1")
     #     pars.add_argument("--layer_option", default="all")
     #     pars.add_argument("--layer_name")
+        pars.add_argument("--element_option", default="all")
+        pars.add_argument("--global_ids")
+        pars.add_argument("--cache_dir", default="")  # reuse unchanged exports
+        pars.add_argument("--dxf_format", default="ascii")  # ascii, binary
+        pars.add_argument("--compression", default="none")  # none, gzip, zip
+        pars.add_argument("--diagnostics", default="off")  # off, summary, info, debug
 
     #     self.dxf = []
     #     self.handle = 255  # handle for DXF ENTITY
     #     self.layers = ["0"]
         self.layer = "0"  # mandatory layer
+        self.skipped = set()  # elements left out by GlobalId selection
+        self.block_count = 0  # stable block names
+        self.cache_path = None
+        self.digest = None  # content hash of the input, options and code
     #     self.layernames = []
     #     self.csp_old = [[0.0, 0.0]] * 4  # previous spline
     #     self.d = [0.0]  # knot vector
@@ -165,6 +224,7 @@ class EzDxfExporter(inkex.OutputExtension):
         # )
         line = block.add_line((csp[0][0], csp[0][1]),(csp[1][0], csp[1][1]))
         line.translate(-first_coord[0], -first_coord[1], 0)
+        self.diagnostics.count(self.layer)
 
     # def LWPOLY_line(self, csp):
     #     if (
@@ -305,6 +365,18 @@ class EzDxfExporter(inkex.OutputExtension):
     #     for i in range(fits):
     #         self.dxf_add(" 11\n%f\n 21\n%f\n 31\n0.0\n" % (self.xfit[i], self.yfit[i]))
 
+    def dxf_primitive(self, block, primitive, first_coord):
+        """Draw a CIRCLE, ARC or ELLIPSE of dxf_primitives"""
+        kind, center = primitive[:2]
+        if kind == "CIRCLE":
+            entity = block.add_circle(center, primitive[2])
+        elif kind == "ARC":
+            entity = block.add_arc(center, primitive[2], primitive[3], primitive[4])
+        else:
+            entity = block.add_ellipse(center, primitive[2], primitive[3])
+        entity.translate(-first_coord[0], -first_coord[1], 0)
+        self.diagnostics.count(self.layer)
+
     def process_shape(self, node, mat, block, insert_point):
         rgb = (0, 0, 0)
         style = node.style("stroke")
@@ -321,12 +393,16 @@ class EzDxfExporter(inkex.OutputExtension):
         # Transforming /after/ superpath is more reliable than before
         # because of some issues with arcs in transformations
         # path = node.path.transform(Transform(mat) @ node.transform)
-        path = node.path.to_superpath().transform(Transform(mat) @ node.transform)
+        transform = Transform(mat) @ node.transform
+        if isinstance(node, (Circle, Ellipse)):
+            primitive = ellipse_primitive(node, transform)
+            if primitive is not None:
+                self.dxf_primitive(block, primitive, insert_point)
+                return
+        path = node.path.to_superpath().transform(transform)
         # first_coord = [path[0][0][1][0], path[0][0][1][1]]
-        inkex.utils.debug('shape')
-        inkex.utils.debug(path[0][0][1])
-        inkex.utils.debug(path[0][1][1])
-        # inkex.utils.debug(first_coord)
+        if self.diagnostics.debugging:
+            self.diagnostics.debug("shape %s %s", path[0][0][1], path[0][1][1])
 
         # If Flatten Beziers is enabled, subdivide our beziers and
         # we'll later just ignore the curve and output flat lines
@@ -335,9 +411,11 @@ class EzDxfExporter(inkex.OutputExtension):
 
         # Now output the path.
         for sub in path:
-            for i in range(len(sub) - 1):
+            i = 0
+            while i < len(sub) - 1:
                 s = sub[i]
                 e = sub[i + 1]
+                i += 1
                 # If flattening beziers, ignore curves and output flat lines
                 # if (s[1] == s[2] and e[0] == e[1]) or self.options.FLATTENBEZ:
                 if (s[1] == s[2] and e[0] == e[1]):
@@ -345,6 +423,12 @@ class EzDxfExporter(inkex.OutputExtension):
                     #     self.LWPOLY_line([s[1], e[1]])
                     # else:
                     self.dxf_line(block, [s[1], e[1]], insert_point)
+                    continue
+                # Circular arcs become native entities, other curves are left out
+                run = arc_run(sub, i - 1)
+                if run is not None:
+                    primitive, i = run
+                    self.dxf_primitive(block, primitive, insert_point)
                 # elif self.options.ROBO:
                 #     self.ROBO_spline([s[1], s[2], e[0], e[1]])
                 # else:
@@ -399,12 +483,15 @@ class EzDxfExporter(inkex.OutputExtension):
         #     layer = layer.replace(" ", "_")
             # if layer in self.layers:
             self.layer = layer
-        block_def = self.dxf.blocks.new(str(uuid4()))
+        self.block_count += 1
+        block_def = self.dxf.blocks.new("IFCBLOCK_%d" % self.block_count)
         trans = group.get("transform")
         insert_point = []
         if trans:
             self.groupmat.append(Transform(self.groupmat[-1]) @ Transform(trans))
         for node in group:
+            if node in self.skipped:
+                continue
             try:
                 if isinstance(node, Group):
                     self.process_group(node)
@@ -422,16 +509,51 @@ class EzDxfExporter(inkex.OutputExtension):
                 ) from e  # pylint: disable=line-too-long
         if trans:
             self.groupmat.pop()
-        inkex.utils.debug(insert_point)
+        self.diagnostics.debug("%s %s", block_def.name, insert_point)
         if insert_point:
-            inkex.utils.debug(block_def.name)
             self.msp.add_blockref(
                             name=block_def.name,
                             insert=insert_point,
                             dxfattribs={"layer": self.layer}
                             )
 
+    def cache_key(self, stream):
+        """Hash of the input SVG, the export options and the exporter code"""
+        key = hashlib.sha256()
+        for chunk in iter(lambda: stream.read(1 << 20), b""):
+            key.update(chunk)
+        options = {
+            name: value
+            for name, value in vars(self.options).items()
+            if name not in ("input_file", "output", "cache_dir")
+        }
+        key.update(repr(sorted(options.items())).encode())
+        if self.options.compression != "none":
+            # zip and gzip store the DXF file name, after the input document
+            key.update(member_name(self.document_path()).encode())
+        key.update(ezdxf.__version__.encode())
+        for module in LOCAL_MODULES:
+            with open(sys.modules[module].__file__, "rb") as fhl:
+                key.update(fhl.read())
+        return key.hexdigest()
+
+    def load(self, stream):
+        if not stream.seekable():
+            stream = io.BytesIO(stream.read())
+        self.digest = self.cache_key(stream)
+        stream.seek(0)
+        if self.options.cache_dir:
+            self.cache_path = os.path.join(self.options.cache_dir, self.digest + ".dxf")
+            if os.path.isfile(self.cache_path):
+                return None  # copied from the cache in save()
+        return super().load(stream)
+
     def save(self, stream):
+        if self.document is None:
+            with open(self.cache_path, "rb") as cached:
+                shutil.copyfileobj(cached, stream)
+            return
+
         # # Warn user if name match field is empty
         # if (
         #     self.options.layer_option
@@ -512,11 +634,36 @@ class EzDxfExporter(inkex.OutputExtension):
         #         if layer not in self.layernames:
         #             inkex.errormsg(_("Warning: Layer '{}' not found!").format(layer))
 
+        self.diagnostics = Diagnostics(self.options.diagnostics)
         self.dxf = ezdxf.new()
         self.msp = self.dxf.modelspace()
-        self.svg = class2layer(self, self.svg)
+        layers, self.skipped, _ = export_layers(
+            self.svg, self.options.global_ids, self.options.element_option
+        )
+        for IfcClass in layers:
+            self.dxf.layers.add(name=IfcClass, color=layer_color(IfcClass))
+        self.diagnostics.info("%d layers from IfcClasses", len(layers))
         self.process_group(self.svg)
-        stream.write(to_binary_data(self.dxf))
+        self.diagnostics.summary()
+        # ezdxf adds the CLASS entries of the DXF types in use in set order,
+        # register them sorted beforehand to keep the CLASSES section stable
+        for dxftype in sorted(self.dxf.entitydb.dxf_types_in_use()):
+            self.dxf.classes.add_class(dxftype)
+        encoding = (
+            self.digest,
+            self.options.dxf_format,
+            self.options.compression,
+            self.document_path(),
+        )
+        if not self.cache_path:
+            write_binary_data(self.dxf, stream, *encoding)
+            return
+        os.makedirs(self.options.cache_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=self.options.cache_dir, delete=False) as cached:
+            write_binary_data(self.dxf, cached, *encoding)
+            cached.seek(0)
+            shutil.copyfileobj(cached, stream)
+        os.replace(cached.name, self.cache_path)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+Headless batch export for the IfcClass ezdxf exporter effect.
+
+Exports BlenderBIM drawings without the export window, using the settings it
+saves (IfcClass -> LayerName, Color, Lineweight, Linetype). Drawings are
+exported in parallel, one worker process per core, cores left over extract the
+layers of each drawing in parallel. The time taken by each drawing is printed
+as it finishes:
+
+  python ezdxf_exporter_batch.py --mapping "MY STOREY PLAN.json" "drawings/*.svg"
+
+Without --mapping every drawing uses the settings saved next to it
+(MY STOREY PLAN.svg -> MY STOREY PLAN.json).
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from ezdxf_exporter_effect import EzDxfExporter
+from ifc_diagnostics import Diagnostics
+
+
+def load_mapping(path):
+    """Return the export options of a settings file, the rows marked for export"""
+    with open(path, "r") as json_file:
+        return [entry for entry in json.load(json_file) if entry["Export"]]
+
+
+def find_drawings(patterns):
+    """Expand file names and glob patterns in the given order, each file once"""
+    drawings = []
+    for pattern in patterns:
+        paths = [pattern] if os.path.isfile(pattern) else sorted(glob.glob(pattern))
+        if not paths:
+            raise FileNotFoundError("No drawing matches '%s'" % pattern)
+        for path in paths:
+            if path not in drawings:
+                drawings.append(path)
+    return drawings
+
+
+def export_drawing(
+    svg_path,
+    export_options,
+    dxf_path,
+    separate_blocks=False,
+    polylines=False,
+    diagnostics="off",
+    jobs=1,
+):
+    """Export one drawing as the export window does, return the number of entities"""
+    exporter = EzDxfExporter()
+    exporter.parse_arguments(["--diagnostics=" + diagnostics, "--jobs=%d" % jobs])
+    exporter.options.input_file = svg_path
+    with open(svg_path, "rb") as stream:
+        exporter.document = exporter.load(stream)
+    exporter.diagnostics = Diagnostics(diagnostics)
+    exporter.class2layer()
+    exporter.export_options = export_options
+    exporter.use_separate_blocks = separate_blocks
+    exporter.use_polylines = polylines
+    exporter.create_dxf()
+    exporter.dxf.saveas(dxf_path)
+    return len(exporter.msp)
+
+
+def run(job):
+    """Worker: export one drawing, return (svg path, seconds, entities, error)"""
+    start = time.perf_counter()
+    try:
+        entities = export_drawing(*job)
+    except Exception as err:  # reported with the drawing, the batch goes on
+        return job[0], time.perf_counter() - start, None, "%s: %s" % (type(err).__name__, err)
+    return job[0], time.perf_counter() - start, entities, None
+
+
+def export_all(jobs, workers):
+    """Yield the results of run as the drawings finish"""
+    if workers == 1:
+        yield from map(run, jobs)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for future in as_completed([pool.submit(run, job) for job in jobs]):
+            yield future.result()
+
+
+def main(args=None):
+    pars = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    pars.add_argument("drawings", nargs="+", help="SVG files or glob patterns")
+    pars.add_argument(
+        "--mapping", help="settings JSON of the export window (default: next to each drawing)"
+    )
+    pars.add_argument("--output_dir", help="folder of the DXF files (default: next to each drawing)")
+    pars.add_argument(
+        "--jobs", type=int, default=os.cpu_count() or 1, help="worker processes (default: one per core)"
+    )
+    pars.add_argument("--separate_blocks", action="store_true", help="one block per element group")
+    pars.add_argument(
+        "--polylines", action="store_true", help="one LWPOLYLINE per path instead of a LINE per segment"
+    )
+    pars.add_argument("--diagnostics", default="off")  # off, summary, info, debug
+    options = pars.parse_args(args)
+
+    mapping = load_mapping(options.mapping) if options.mapping else None
+    try:
+        drawings = find_drawings(options.drawings)
+    except FileNotFoundError as err:
+        pars.error(str(err))
+    jobs = []
+    for svg_path in drawings:
+        name = os.path.splitext(os.path.basename(svg_path))[0]
+        export_options = mapping
+        if export_options is None:
+            settings = os.path.splitext(svg_path)[0] + ".json"
+            if not os.path.isfile(settings):
+                pars.error("No settings for '%s', expected '%s' or --mapping" % (svg_path, settings))
+            export_options = load_mapping(settings)
+        dxf_path = os.path.join(options.output_dir or os.path.dirname(svg_path), name + ".dxf")
+        jobs.append(
+            [
+                svg_path,
+                export_options,
+                dxf_path,
+                options.separate_blocks,
+                options.polylines,
+                options.diagnostics,
+            ]
+        )
+    if options.output_dir:
+        os.makedirs(options.output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    workers = max(1, min(options.jobs, len(jobs)))
+    # Cores left over by the drawings extract the layers of each drawing in parallel
+    for job in jobs:
+        job.append(max(1, options.jobs // workers))
+    failed = 0
+    for svg_path, seconds, entities, error in export_all(jobs, workers):
+        if error is None:
+            print("%8.2fs  %s (%d entities)" % (seconds, svg_path, entities))
+        else:
+            failed += 1
+            print("%8.2fs  %s failed: %s" % (seconds, svg_path, error), file=sys.stderr)
+    print(
+        "%8.2fs  %d drawings, %d failed, %d workers"
+        % (time.perf_counter() - start, len(jobs), failed, workers)
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
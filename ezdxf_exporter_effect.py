@@ -43,35 +43,188 @@ from inkex import (
 
 import ezdxf
 from uuid import uuid4
-import gi
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 import io
 import os
 import json
+import multiprocessing
 import re
 
-gi.require_version("Gtk", "3.0")
-from gi.repository import Gtk
-
-def get_insert_point(node, mat):
+from ifc_layers import class2layer
+from ifc_diagnostics import Diagnostics
+from dxf_primitives import arc_run, ellipse_primitive
+
+try:
+    import gi
+
+    gi.require_version("Gtk", "3.0")
+    from gi.repository import Gtk
+except (ImportError, ValueError):
+    Gtk = None  # headless, see ezdxf_exporter_batch.py
+
+# Lineweights offered by the export window and their DXF values in 1/100 mm
+LINEWEIGHTS = [
+    ('0', 0), ('0.05', 5), ('0.09', 9), ('0.13', 13), ('0.15', 15), ('0.18', 18), ('0.20', 20), ('0.25', 25),
+    ('0.30', 30), ('0.35', 35), ('0.40', 40), ('0.50', 50), ('0.53', 53), ('0.60', 60), ('0.70', 70), ('0.80', 80), ('0.90', 90),
+    ('1.00', 100), ('1.06', 106), ('1.20', 120), ('1.40', 140), ('1.58', 158), ('2.00', 200), ('2.11', 211)]
+LINEWEIGHT_VALUES = dict(LINEWEIGHTS)
+LINEWEIGHT_NAMES = {value: name for name, value in LINEWEIGHTS}
+
+
+class ExportProfile:
+    """Export options compiled once per export for the lookups of the traversal"""
+
+    def __init__(self, export_options):
+        self.by_class = {}  # IfcClass -> entry, the last one wins as in the row scan
+        self.by_layer = {}  # LayerName -> entry, the first one wins
+        for entry in export_options:
+            self.by_class[entry['IfcClass']] = entry
+            self.by_layer.setdefault(entry['LayerName'], entry)
+
+    def skips(self, node):
+        """Whether node is a layer of an IfcClass that is not exported"""
+        return (
+            node.get('inkscape:groupmode') == 'layer'
+            and node.get('inkscape:label') not in self.by_class
+        )
+
+
+class NodeGeometry:
+    """Combined transform of a node under mat and its transformed superpath,
+    each computed once when first asked for. Block mode shares them between
+    the insert point of the block and the entities of the node."""
+
+    __slots__ = ("node", "mat", "_transform", "_superpath")
+
+    def __init__(self, node, mat):
+        self.node = node
+        self.mat = mat
+        self._transform = None
+        self._superpath = None
+
+    @property
+    def transform(self):
+        if self._transform is None:
+            # node.transform would write the attribute back rounded, and a
+            # second export from the same window would see other positions
+            self._transform = Transform(self.mat) @ Transform(self.node.attrib.get("transform"))
+        return self._transform
+
+    @property
+    def superpath(self):
+        if self._superpath is None:
+            self._superpath = self.node.path.to_superpath().transform(self.transform)
+        return self._superpath
+
+
+def get_insert_point(geometry):
+    node = geometry.node
     if not isinstance(node, (PathElement, Rectangle, Line, Circle, Ellipse, TextElement)):
             return
     if isinstance(node, TextElement):
-        trans = Transform(mat) @ node.transform
-        return trans.apply_to_point([node.x, node.y])
-    path = node.path.to_superpath().transform(Transform(mat) @ node.transform)
+        return geometry.transform.apply_to_point([node.x, node.y])
+    path = geometry.superpath
     return [path[0][0][1][0], path[0][0][1][1]]
 
+class GeometryBuffer:
+    """Stand-in for the ezdxf model space that records the entities added to it.
+
+    Worker processes fill one per top level element, the lines as flat
+    coordinates that pickle as raw bytes. replay adds the entities to the real
+    model space in the order they were recorded.
+    """
+
+    def __init__(self):
+        self.coords = array("d")  # x1, y1, x2, y2 of every line, x, y of polyline points
+        # ["LINE", dxfattribs, lines], ["LWPOLYLINE", dxfattribs, (points, close)],
+        # ["TEXT", text, dxfattribs] or [primitive kind, dxfattribs, arguments]
+        self.runs = []
+
+    def add_line(self, start, end, dxfattribs):
+        self.coords.extend((start[0], start[1], end[0], end[1]))
+        if self.runs and self.runs[-1][0] == "LINE" and self.runs[-1][1] == dxfattribs:
+            self.runs[-1][2] += 1
+        else:
+            self.runs.append(["LINE", dxfattribs, 1])
+
+    def add_lwpolyline(self, points, format="xy", close=False, dxfattribs=None):
+        size = len(self.coords)
+        for point in points:
+            self.coords.extend(point)
+        self.runs.append(["LWPOLYLINE", dxfattribs, ((len(self.coords) - size) // 2, close)])
+
+    def add_text(self, text, dxfattribs):
+        self.runs.append(["TEXT", text, dxfattribs])
+
+    def add_circle(self, center, radius, dxfattribs):
+        self.runs.append(["CIRCLE", dxfattribs, (center, radius)])
+
+    def add_arc(self, center, radius, start_angle, end_angle, dxfattribs):
+        self.runs.append(["ARC", dxfattribs, (center, radius, start_angle, end_angle)])
+
+    def add_ellipse(self, center, major_axis, ratio, dxfattribs):
+        self.runs.append(["ELLIPSE", dxfattribs, (center, major_axis, ratio)])
+
+    def replay(self, layout, diagnostics):
+        coords = self.coords
+        start = 0
+        for kind, value, extra in self.runs:
+            if kind == "TEXT":
+                layout.add_text(value, dxfattribs=extra)
+                diagnostics.count(extra["layer"])
+                continue
+            if kind in ("CIRCLE", "ARC", "ELLIPSE"):
+                getattr(layout, "add_" + kind.lower())(*extra, dxfattribs=value)
+                diagnostics.count(value["layer"])
+                continue
+            if kind == "LWPOLYLINE":
+                end = start + 2 * extra[0]
+                points = zip(coords[start:end:2], coords[start + 1:end:2])
+                layout.add_lwpolyline(points, format="xy", close=extra[1], dxfattribs=value)
+                diagnostics.count(value["layer"])
+                start = end
+                continue
+            end = start + 4 * extra
+            for i in range(start, end, 4):
+                layout.add_line(
+                    (coords[i], coords[i + 1]), (coords[i + 2], coords[i + 3]), dxfattribs=value
+                )
+            diagnostics.count(value["layer"], extra)
+            start = end
+
+
+_FORKED = None  # (exporter, layer) shared with the workers of extract_parallel
+
+
+def extract_element(index):
+    """Worker: record the entities of one top level element"""
+    exporter, layer = _FORKED
+    exporter.msp = GeometryBuffer()
+    exporter.process_children([exporter.svg[index]], layer)
+    return exporter.msp
+
+
 class EzDxfExporter(inkex.EffectExtension):
 
     def __init__(self):
         super().__init__()
         # Initialize attributes
         self.export_options = []
+        self.profile = ExportProfile(self.export_options)
         self.layer_list = []
         self.color = 7  # Default color (black)
         self.use_separate_blocks = False  # Option for separate blocks vs direct model space
+        self.use_polylines = False  # One LWPOLYLINE per run of straight segments instead of LINEs
+        self.diagnostics = Diagnostics()
 
-    class ExportWindow(Gtk.Window):
+    def add_arguments(self, pars):
+        pars.add_argument("--diagnostics", default="off")  # off, summary, info, debug
+        # Worker processes, 0: one per core. Forking the Inkscape (GTK) process
+        # is not safe, so the effect extracts sequentially unless asked to
+        pars.add_argument("--jobs", type=int, default=1)
+
+    class ExportWindow(Gtk.Window if Gtk else object):
         def __init__(self, exporter):
             self.exporter = exporter
             super().__init__(title='EzDXF Exporter')
@@ -131,9 +284,12 @@ class EzDxfExporter(inkex.EffectExtension):
             # Add checkbox for separate blocks option
             self.separate_blocks_checkbox = Gtk.CheckButton(label="Create Separate Blocks per Element")
             self.separate_blocks_checkbox.set_active(False)  # Default to direct model space
+            self.polylines_checkbox = Gtk.CheckButton(label="Export Paths as Polylines")
+            self.polylines_checkbox.set_active(False)  # Default to one LINE per segment
             
             hbox.pack_start(treeview, True, True, 0)
             hbox.pack_start(self.separate_blocks_checkbox, False, False, 0)
+            hbox.pack_start(self.polylines_checkbox, False, False, 0)
             button = Gtk.Button.new_with_label('Export DXF')
             button.connect('clicked', self.on_click_export)
             export_button = Gtk.Button(label="Save Settings")
@@ -147,13 +303,9 @@ class EzDxfExporter(inkex.EffectExtension):
             self.add(hbox)
 
         def create_lineweight_model(self):
-            lineweights = [
-                ['0', 0], ['0.05', 5], ['0.09', 9], ['0.13', 13], ['0.15', 15], ['0.18', 18], ['0.20', 20], ['0.25', 25],
-                ['0.30', 30], ['0.35', 35], ['0.40', 40], ['0.50', 50], ['0.53', 53], ['0.60', 60], ['0.70', 70], ['0.80', 80], ['0.90', 90],
-                ['1.00', 100], ['1.06', 106], ['1.20', 120], ['1.40', 140], ['1.58', 158], ['2.00', 200], ['2.11', 211]]
             lineweight_model = Gtk.ListStore(str, int)
-            for lineweight in lineweights:               
-                lineweight_model.append(lineweight)
+            for lineweight in LINEWEIGHTS:
+                lineweight_model.append(list(lineweight))
             return lineweight_model
         
         def on_combo_changed(self, widget, path, text, column):
@@ -165,16 +317,10 @@ class EzDxfExporter(inkex.EffectExtension):
             self.liststore[path][column] = text
 
         def get_lineweight_integer_value(self, lineweight_str):
-            for row in self.create_lineweight_model():
-                if row[0] == lineweight_str:
-                    return row[1]
-            return None
+            return LINEWEIGHT_VALUES.get(lineweight_str)
 
         def get_lineweight_string_value(self, lineweight_int):
-            for row in self.create_lineweight_model():
-                if row[1] == lineweight_int:
-                    return row[0]
-            return None
+            return LINEWEIGHT_NAMES.get(lineweight_int)
 
         def color_entry_edited(self, widget, path, text):
             self.liststore[path][3] = int(text)
@@ -186,6 +332,7 @@ class EzDxfExporter(inkex.EffectExtension):
             self.exporter.export_options = []
             # Store the checkbox state - True means use blocks, False means direct model space
             self.exporter.use_separate_blocks = self.separate_blocks_checkbox.get_active()
+            self.exporter.use_polylines = self.polylines_checkbox.get_active()
             for row in self.liststore:
                 if row[0]:
                     self.exporter.export_options.append({
@@ -323,67 +470,25 @@ class EzDxfExporter(inkex.EffectExtension):
             dialog.destroy()
 
     def build_gui(self):
+        if Gtk is None:
+            raise inkex.AbortExtension(
+                "The export window needs GTK 3 (PyGObject). Without it use "
+                "ezdxf_exporter_batch.py to export from the command line."
+            )
         window = self.ExportWindow(self)
         for layer in self.layer_list:       
             window.liststore.append([True, layer, 'A-'+layer[3:].upper(), 0, '0', 'Continuous'])
         window.show_all()
         Gtk.main()
 
-    def find_text_parent(self, element):
-        """Find the parent text element if this element is a child of a text element"""
-        parent = element.getparent()
-        while parent is not None:
-            if isinstance(parent, TextElement):
-                return parent
-            parent = parent.getparent()
-        return None
-
     def class2layer(self):
-        inkex.utils.errormsg("elements")
-        self.layer_list = []
-        xpath_expr = "//*[contains(concat(' ', normalize-space(@class), ' '), ' Ifc')]"
-        elements = self.svg.xpath(xpath_expr)
-        # Keep track of elements we've already processed to avoid duplicates
-        processed_elements = set()
-        
-        for element in elements:
-            # Check if this element is a child of a text element (like tspan, tref, etc.)
-            text_parent = self.find_text_parent(element)
-            
-            # If this element is part of a text element, move the parent text element instead
-            if text_parent is not None:
-                element_to_move = text_parent
-            else:
-                element_to_move = element
-            
-            # Skip if we've already processed this element
-            element_id = element_to_move.get_id()
-            if element_id in processed_elements:
-                continue
-            
-            processed_elements.add(element_id)
-            
-            # Get IFC class from the original element (not necessarily the one we're moving)
-            classes = element.get('class').split()
-            IfcClass = [string for string in classes if string.startswith('Ifc')][0]
-            
-            if IfcClass not in self.layer_list:
-                layer = self.svg.add(Group(id=IfcClass))
-                layer.set('inkscape:groupmode', 'layer')
-                layer.set('inkscape:label', IfcClass)
-                self.layer_list.append(IfcClass)
-            else:
-                layer = self.svg.getElementById(IfcClass)
-            
-            # Move the element (or its text parent) to the layer
-            if element_to_move.getparent() is not None:
-                element_to_move.getparent().remove(element_to_move)
-                layer.add(element_to_move)
+        # Classed tspan/tref children move together with their text element
+        self.layer_list = list(class2layer(self.svg, text_parents=True))
+        self.diagnostics.info("%d layers from IfcClasses", len(self.layer_list))
 
     def create_dxf_layers(self):
         """Create DXF layers based on export options"""
-        for entry in self.export_options:
-            layer_name = entry['LayerName']
+        for layer_name, entry in self.profile.by_layer.items():
             if not self.dxf.layers.has_entry(layer_name):
                 self.dxf.layers.add(
                     name=layer_name,
@@ -392,13 +497,6 @@ class EzDxfExporter(inkex.EffectExtension):
                     linetype=entry['Linetype'],
                 )
 
-    def filter_svg(self):
-        export_labels = {layer['IfcClass'] for layer in self.export_options}
-        layers = self.svg.xpath('//svg:g[@inkscape:groupmode="layer"]', namespaces=inkex.NSS)
-        for layer in layers:
-            if layer.label not in export_labels:
-                layer.delete()
-
     def dxf_add(self, str):
         self.dxf.append(str.encode(self.options.char_encode))
 
@@ -407,8 +505,39 @@ class EzDxfExporter(inkex.EffectExtension):
         line = target.add_line((csp[0][0], csp[0][1]), (csp[1][0], csp[1][1]), dxfattribs={'layer': layer_name, 'color': 256})
         if offset:
             line.translate(-offset[0], -offset[1], 0)
+        self.diagnostics.count(layer_name)
+
+    def dxf_lwpolyline(self, target, coords, offset=None, layer_name="0"):
+        """Draw a LWPOLYLINE through the flat x, y coordinates, closed when it
+        ends where it starts - works with both blocks and modelspace"""
+        if len(coords) == 4:
+            # A single segment stays a LINE, which ezdxf creates and writes faster
+            self.dxf_line(target, [coords[:2], coords[2:]], offset, layer_name)
+            return
+        close = len(coords) > 6 and coords[:2] == coords[-2:]
+        if close:
+            del coords[-2:]
+        points = zip(coords[0::2], coords[1::2])
+        polyline = target.add_lwpolyline(points, format="xy", close=close, dxfattribs={'layer': layer_name, 'color': 256})
+        if offset:
+            polyline.translate(-offset[0], -offset[1], 0)
+        self.diagnostics.count(layer_name)
+
+    def dxf_primitive(self, target, primitive, offset=None, layer_name="0"):
+        """Draw a CIRCLE, ARC or ELLIPSE of dxf_primitives - works with both blocks and modelspace"""
+        kind, center = primitive[:2]
+        dxfattribs = {'layer': layer_name, 'color': 256}
+        if kind == "CIRCLE":
+            entity = target.add_circle(center, primitive[2], dxfattribs=dxfattribs)
+        elif kind == "ARC":
+            entity = target.add_arc(center, primitive[2], primitive[3], primitive[4], dxfattribs=dxfattribs)
+        else:
+            entity = target.add_ellipse(center, primitive[2], primitive[3], dxfattribs=dxfattribs)
+        if offset:
+            entity.translate(-offset[0], -offset[1], 0)
+        self.diagnostics.count(layer_name)
 
-    def process_text(self, node, mat, target, layer_name="0", offset=None):
+    def process_text(self, node, mat, target, layer_name="0", offset=None, geometry=None):
         """Process a text element - works with both blocks and modelspace"""
         if not isinstance(node, TextElement):
             return
@@ -432,17 +561,16 @@ class EzDxfExporter(inkex.EffectExtension):
                 pass  # use default
 
         # Get text color from layer instead of individual element
-        color = 7  # default is black
-        for entry in self.export_options:
-            if entry['LayerName'] == layer_name:
-                color = entry['Color']
-                break
+        entry = self.profile.by_layer.get(layer_name)
+        color = entry['Color'] if entry is not None else 7  # default is black
 
         # Calculate the combined transform matrix
-        combined_transform = Transform(mat) @ node.transform
+        if geometry is None:
+            geometry = NodeGeometry(node, mat)
+        combined_transform = geometry.transform
         
         # Get position and apply transform
-        pos = get_insert_point(node, mat)
+        pos = get_insert_point(geometry)
 
         # Extract rotation from the combined transform matrix
         import math
@@ -471,8 +599,9 @@ class EzDxfExporter(inkex.EffectExtension):
         
         if offset:
             text_entity.translate(-offset[0], -offset[1], 0)
+        self.diagnostics.count(layer_name)
 
-    def process_shape(self, node, mat, target, layer_name="0", offset=None):
+    def process_shape(self, node, mat, target, layer_name="0", offset=None, geometry=None):
         """Process individual shapes - works with both blocks and modelspace"""
         rgb = (0, 0, 0)
         style = node.style("stroke")
@@ -486,14 +615,41 @@ class EzDxfExporter(inkex.EffectExtension):
         if not isinstance(node, (PathElement, Rectangle, Line, Circle, Ellipse)):
             return
 
-        path = node.path.to_superpath().transform(Transform(mat) @ node.transform)
+        if geometry is None:
+            geometry = NodeGeometry(node, mat)
+        if isinstance(node, (Circle, Ellipse)):
+            primitive = ellipse_primitive(node, geometry.transform)
+            if primitive is not None:
+                self.dxf_primitive(target, primitive, offset, layer_name)
+                return
+        path = geometry.superpath
 
         for sub in path:
-            for i in range(len(sub) - 1):
+            coords = []  # polyline through the straight segments so far
+            i = 0
+            while i < len(sub) - 1:
                 s = sub[i]
                 e = sub[i + 1]
+                i += 1
                 if (s[1] == s[2] and e[0] == e[1]):
-                    self.dxf_line(target, [s[1], e[1]], offset, layer_name)
+                    if not self.use_polylines:
+                        self.dxf_line(target, [s[1], e[1]], offset, layer_name)
+                        continue
+                    if not coords:
+                        coords.extend(s[1])
+                    coords.extend(e[1])
+                    continue
+                if coords:
+                    # Curves end the polyline
+                    self.dxf_lwpolyline(target, coords, offset, layer_name)
+                    coords = []
+                run = arc_run(sub, i - 1)
+                if run is not None:
+                    primitive, i = run
+                    self.dxf_primitive(target, primitive, offset, layer_name)
+                # Other curves are left out
+            if coords:
+                self.dxf_lwpolyline(target, coords, offset, layer_name)
 
     def process_clone(self, node, layer):
         """Process a clone node, looking for internal paths"""
@@ -536,10 +692,10 @@ class EzDxfExporter(inkex.EffectExtension):
     def process_group(self, group, layer="0"):
         current_layer = layer
         if group.get('inkscape:groupmode') == 'layer':
-            layer_label = group.get('inkscape:label')
-            for entry in self.export_options:
-                if entry['IfcClass'] == layer_label:
-                    current_layer = entry['LayerName']
+            entry = self.profile.by_class.get(group.get('inkscape:label'))
+            if entry is None:
+                return  # not exported, the document is left as it is
+            current_layer = entry['LayerName']
 
         trans = group.get("transform")
         
@@ -548,21 +704,10 @@ class EzDxfExporter(inkex.EffectExtension):
         
         # If use_separate_blocks is False, add directly to model space
         if not self.use_separate_blocks:
-            for node in group:
-                try:
-                    if isinstance(node, Group):
-                        self.process_group(node, current_layer)
-                    elif isinstance(node, Use):
-                        self.process_clone(node, current_layer)
-                    else:
-                        if isinstance(node, TextElement):
-                            self.process_text(node, self.groupmat[-1], self.msp, current_layer)
-                        else:
-                            self.process_shape(node, self.groupmat[-1], self.msp, current_layer)
-                except RecursionError as e:
-                    raise inkex.AbortExtension(
-                        'Too many nested groups. Please use the "Deep Ungroup" extension first.'
-                    ) from e
+            if group is self.svg and self.workers(len(group)) > 1:
+                self.extract_parallel(group, current_layer)
+            else:
+                self.process_children(group, current_layer)
         else:
             # Create block for group (original behavior)
             block_def = self.dxf.blocks.new(str(uuid4()))
@@ -575,12 +720,14 @@ class EzDxfExporter(inkex.EffectExtension):
                     elif isinstance(node, Use):
                         self.process_clone(node, current_layer)
                     else:
+                        # The first node gives the insert point, from the geometry it is drawn with
+                        geometry = NodeGeometry(node, self.groupmat[-1])
                         if not insert_point:
-                            insert_point = get_insert_point(node, self.groupmat[-1])
+                            insert_point = get_insert_point(geometry)
                         if isinstance(node, TextElement):
-                            self.process_text(node, self.groupmat[-1], block_def, current_layer, insert_point)
+                            self.process_text(node, self.groupmat[-1], block_def, current_layer, insert_point, geometry)
                         else:
-                            self.process_shape(node, self.groupmat[-1], block_def, current_layer, insert_point)
+                            self.process_shape(node, self.groupmat[-1], block_def, current_layer, insert_point, geometry)
                 except RecursionError as e:
                     raise inkex.AbortExtension(
                         'Too many nested groups. Please use the "Deep Ungroup" extension first.'
@@ -597,17 +744,64 @@ class EzDxfExporter(inkex.EffectExtension):
         if trans:
             self.groupmat.pop()
 
+    def process_children(self, nodes, layer):
+        """Add the elements directly to model space"""
+        for node in nodes:
+            try:
+                if isinstance(node, Group):
+                    self.process_group(node, layer)
+                elif isinstance(node, Use):
+                    self.process_clone(node, layer)
+                else:
+                    if isinstance(node, TextElement):
+                        self.process_text(node, self.groupmat[-1], self.msp, layer)
+                    else:
+                        self.process_shape(node, self.groupmat[-1], self.msp, layer)
+            except RecursionError as e:
+                raise inkex.AbortExtension(
+                    'Too many nested groups. Please use the "Deep Ungroup" extension first.'
+                ) from e
+
+    def workers(self, elements):
+        """Number of worker processes for the top level elements, 1 when the
+        document cannot be shared with forked processes"""
+        if "fork" not in multiprocessing.get_all_start_methods():
+            return 1
+        return max(1, min(self.options.jobs or os.cpu_count() or 1, elements))
+
+    def extract_parallel(self, group, layer):
+        """Add the elements of the root to model space, the geometry of every top
+        level element (an IfcClass layer after class2layer) extracted by a worker.
+
+        The workers are forked, so they share the loaded document as it is.
+        Their entities are added in document order, as a sequential export would.
+        """
+        global _FORKED
+        _FORKED = (self, layer)
+        # Layers that are not exported are not handed to the workers at all
+        indexes = [i for i, node in enumerate(group) if not self.profile.skips(node)]
+        try:
+            with ProcessPoolExecutor(
+                self.workers(len(indexes)), mp_context=multiprocessing.get_context("fork")
+            ) as pool:
+                for geometry in pool.map(extract_element, indexes):
+                    geometry.replay(self.msp, self.diagnostics)
+        finally:
+            _FORKED = None
+
     def create_dxf(self):
         try:
             scale = self.svg.inkscape_scale
             self.groupmat = [
                 [[scale, 0.0, 0.0], [0.0, -scale, self.svg.viewbox_height * scale]]
             ]
+            self.diagnostics = Diagnostics(self.options.diagnostics)
             self.dxf = ezdxf.new(setup=True)
             self.msp = self.dxf.modelspace()
+            self.profile = ExportProfile(self.export_options)
             self.create_dxf_layers()
-            self.filter_svg()
             self.process_group(self.svg, "0")
+            self.diagnostics.summary()
 
             
         except Exception as e:
@@ -616,6 +810,7 @@ class EzDxfExporter(inkex.EffectExtension):
             raise
 
     def effect(self):
+        self.diagnostics = Diagnostics(self.options.diagnostics)
         self.class2layer()
         self.build_gui()
         
@@ -35,6 +35,15 @@ The spec can be found here: http://www.autodesk.com/techpubs/autocad/acadr14/dxf
 
 from __future__ import print_function
 
+import copy
+import hashlib
+import os
+import shutil
+import tempfile
+from array import array
+
+from lxml import etree
+
 import inkex
 from inkex import (
     colors,
@@ -43,6 +52,9 @@ from inkex import (
     Group,
     Layer,
     Use,
+    Symbol,
+    TextElement,
+    FlowRoot,
     PathElement,
     Rectangle,
     Line,
@@ -50,58 +62,289 @@ from inkex import (
     Ellipse,
 )
 from inkex.localization import inkex_gettext as _
+from inkex.units import convert_unit, parse_unit
+
+from ifc_layers import export_layers
+from ifc_diagnostics import Diagnostics
+from dxf_output import (
+    SENTINEL,
+    ascii_to_binary,
+    binary_line,
+    binary_lwpolyline,
+    container,
+    member_name,
+)
+from dxf_primitives import FULL_TURN, arc_run, ellipse_primitive
 
+BUFFER_SIZE = 1 << 20  # bytes copied at a time from the spooled output
 
-def get_matrix(u, i, j):
-    if j == i + 2:
-        return (
-            (u[i] - u[i - 1])
-            * (u[i] - u[i - 1])
-            / (u[i + 2] - u[i - 1])
-            / (u[i + 1] - u[i - 1])
-        )
-    elif j == i + 1:
-        return (
-            (u[i] - u[i - 1]) * (u[i + 2] - u[i]) / (u[i + 2] - u[i - 1])
-            + (u[i + 1] - u[i]) * (u[i] - u[i - 2]) / (u[i + 1] - u[i - 2])
-        ) / (u[i + 1] - u[i - 1])
-    elif j == i:
-        return (
-            (u[i + 1] - u[i])
-            * (u[i + 1] - u[i])
-            / (u[i + 1] - u[i - 2])
-            / (u[i + 1] - u[i - 1])
-        )
-    else:
-        return 0
+# Bernstein weights of the ROBO fit points at u = 1/3, 2/3 and 1
+ROBO_BASIS = [
+    [(1 - u) ** 3, 3 * (1 - u) ** 2 * u, 3 * (1 - u) * u**2, u**3]
+    for u in (1 / 3.0, 2 / 3.0, 3 / 3.0)
+]
+
+
+def coordinate_unit(svg):
+    """Unit of the exported coordinates. User units are scaled by
+    inkscape_scale, which takes them to the unit of the width (or height)
+    attribute, whatever the display unit of the namedview says."""
+    unit = (parse_unit(svg.get("width")) or parse_unit(svg.get("height")) or (0, "px"))[1]
+    return "px" if unit == "%" else unit
 
 
-def get_fit(u, csp, col):
+def get_matrix_bands(u, fits):
+    """Diagonals (i, i), (i, i + 1) and (i, i + 2) of the fit rows of the
+    ROBO spline matrix, for all rows i at once. u is a NumPy knot array
+    padded as in ROBO_output, negative indices wrap to the padding."""
+    import numpy
+
+    i = numpy.arange(fits)
+    um2, um1, u0, up1, up2 = u[i - 2], u[i - 1], u[i], u[i + 1], u[i + 2]
     return (
-        (1 - u) ** 3 * csp[0][col]
-        + 3 * (1 - u) ** 2 * u * csp[1][col]
-        + 3 * (1 - u) * u**2 * csp[2][col]
-        + u**3 * csp[3][col]
+        (up1 - u0) * (up1 - u0) / (up1 - um2) / (up1 - um1),
+        (
+            (u0 - um1) * (up2 - u0) / (up2 - um1)
+            + (up1 - u0) * (u0 - um2) / (up1 - um2)
+        )
+        / (up1 - um1),
+        (u0 - um1) * (u0 - um1) / (up2 - um1) / (up1 - um1),
     )
 
-def class2layer(svg):
-    layer_list = []
-    xpath_expr = "//*[contains(concat(' ', normalize-space(@class), ' '), ' Ifc')]"
-    elements = svg.xpath(xpath_expr)
-    for element in elements:
-        classes = element.get('class').split()
-        IfcClass = [string for string in classes if string.startswith('Ifc')][0]
-        inkex.utils.debug(IfcClass)
-        if IfcClass not in layer_list:
-            layer = svg.add(Group(id=IfcClass))
-            layer.set('inkscape:groupmode', 'layer')
-            layer.set('inkscape:label', IfcClass)
-            layer_list.append(IfcClass)
-        else:
-            layer = svg.getElementById(IfcClass)
-        layer.add(element)
-        # inkex.utils.debug(IfcClass)
-    return svg
+
+def solve_banded(rows, rhs):
+    """Solve the banded system of {column: value} rows for the rhs lists,
+    by Gaussian elimination with partial pivoting"""
+    from numpy.linalg import LinAlgError
+
+    count = len(rows)
+    rhs = [list(values) for values in rhs]
+    for k in range(count):
+        below = k + 1
+        while below < count and k in rows[below]:
+            below += 1
+        pivot = k
+        size = abs(rows[k].get(k, 0.0))
+        for r in range(k + 1, below):
+            if abs(rows[r][k]) > size:
+                pivot, size = r, abs(rows[r][k])
+        if pivot != k:
+            rows[k], rows[pivot] = rows[pivot], rows[k]
+            rhs[k], rhs[pivot] = rhs[pivot], rhs[k]
+        row = rows[k]
+        if not row.get(k):
+            raise LinAlgError("Singular matrix")
+        for r in range(k + 1, below):
+            factor = rows[r].pop(k) / row[k]
+            other = rows[r]
+            for column, value in row.items():
+                if column != k:
+                    other[column] = other.get(column, 0.0) - factor * value
+            rhs[r] = [a - factor * b for a, b in zip(rhs[r], rhs[k])]
+    solution = [None] * count
+    for k in range(count - 1, -1, -1):
+        values = rhs[k]
+        for column, value in rows[k].items():
+            if column != k:
+                values = [a - value * b for a, b in zip(values, solution[column])]
+        solution[k] = [a / rows[k][k] for a in values]
+    return solution
+
+
+def get_fits(coords):
+    """Fit points at u = 1/3, 2/3 and 1 of a run of Bézier segments, after
+    the start point of the run, and the cumulative chord lengths between
+    them, computed for all segments at once. coords holds the x, y of the 4
+    control points of every segment."""
+    import numpy
+
+    csps = numpy.array(coords, dtype=float).reshape(-1, 4, 2)
+    fit = numpy.empty((3 * len(csps) + 1, 2))
+    fit[0] = csps[0, 0]
+    fit[1:] = (ROBO_BASIS @ csps).reshape(-1, 2)
+    step = fit[1:] - fit[:-1]
+    d = numpy.zeros(len(fit))
+    numpy.cumsum(numpy.hypot(step[:, 0], step[:, 1]), out=d[1:])
+    return fit, d
+
+
+def flatten_superpath(path, tolerance):
+    """Return the path with its Bézier segments replaced by straight lines
+    within tolerance of the curve, bezier.cspsubdiv without NumPy"""
+    curved = [
+        (k, i)
+        for k, sub in enumerate(path)
+        for i in range(1, len(sub))
+        if not (sub[i - 1][1] == sub[i - 1][2] and sub[i][0] == sub[i][1])
+    ]
+    if not curved:
+        return path
+    try:
+        import numpy
+    except ImportError:
+        bezier.cspsubdiv(path, tolerance)
+        return path
+
+    def get_steps(ctrl):
+        second = numpy.maximum(
+            numpy.hypot(*(ctrl[:, 0] - 2 * ctrl[:, 1] + ctrl[:, 2]).T),
+            numpy.hypot(*(ctrl[:, 1] - 2 * ctrl[:, 2] + ctrl[:, 3]).T),
+        )
+        steps = numpy.maximum(1, numpy.ceil(numpy.sqrt(0.75 * second / tolerance)))
+        # A single chord is within 3/4 of the control point distance to it, as
+        # long as the control points project onto the chord
+        chord = ctrl[:, 3] - ctrl[:, 0]
+        length = numpy.maximum(numpy.hypot(*chord.T), 1e-12)[:, None]
+        offsets = ctrl[:, 1:3] - ctrl[:, :1]
+        along = (offsets * chord[:, None]).sum(axis=2) / length**2
+        across = (
+            numpy.abs(offsets[..., 0] * chord[:, 1:] - offsets[..., 1] * chord[:, :1])
+            / length
+        )
+        flat = (0.75 * across.max(axis=1) <= tolerance) & numpy.all(
+            (along >= 0) & (along <= 1), axis=1
+        )
+        steps[flat] = 1
+        return steps
+
+    ctrl = numpy.array(
+        [
+            (path[k][i - 1][1], path[k][i - 1][2], path[k][i][0], path[k][i][1])
+            for k, i in curved
+        ],
+        dtype=float,
+    )
+    # Halve the pieces that need more than one step, down to flat pieces
+    levels = []  # [ctrl, steps, parent, owner, offset, split] per depth
+    parent = owner = numpy.arange(len(ctrl))
+    offset = numpy.zeros(len(ctrl))  # start parameter of a piece in its segment
+    for depth in range(1, 17):
+        steps = get_steps(ctrl)
+        split = steps > 1
+        levels.append([ctrl, steps, parent, owner, offset, split])
+        if not split.any():
+            break
+        ctrl = ctrl[split]
+        a = (ctrl[:, :3] + ctrl[:, 1:]) / 2
+        b = (a[:, :2] + a[:, 1:]) / 2
+        c = (b[:, 0] + b[:, 1]) / 2
+        ctrl = numpy.stack(
+            (ctrl[:, 0], a[:, 0], b[:, 0], c, c, b[:, 1], a[:, 2], ctrl[:, 3]), axis=1
+        ).reshape(-1, 4, 2)
+        parent = numpy.repeat(numpy.flatnonzero(split), 2)
+        owner = owner[parent]
+        offset = offset[parent] + numpy.tile((0, 0.5**depth), len(parent) // 2)
+    levels[-1][5] = numpy.zeros(len(levels[-1][0]), dtype=bool)
+    # Keep a split only where the halves need fewer steps than the piece
+    for depth in range(len(levels) - 1, 0, -1):
+        steps, parent = levels[depth][1:3]
+        above = levels[depth - 1]
+        halves = numpy.bincount(parent, steps, len(above[1]))
+        above[5] &= halves < above[1]
+        above[1] = numpy.where(above[5], halves, above[1])
+    # Collect the unsplit pieces reached from the segments
+    pieces = []
+    reached = numpy.ones(len(levels[0][0]), dtype=bool)
+    for depth, (ctrl, steps, parent, owner, offset, split) in enumerate(levels):
+        if depth:
+            reached = reached[parent]
+        final = reached & ~split
+        pieces.append((ctrl[final], steps[final], owner[final], offset[final]))
+        reached &= split
+    ctrl, steps, owner, offset = map(numpy.concatenate, zip(*pieces))
+    order = numpy.lexsort((offset, owner))
+    ctrl = ctrl[order]
+    steps = steps[order].astype(int)
+    owner = owner[order]
+
+    ends = numpy.cumsum(steps)
+    piece = numpy.repeat(numpy.arange(len(ctrl)), steps)
+    t = (numpy.arange(ends[-1]) - numpy.repeat(ends - steps, steps) + 1) / steps[piece]
+    s = 1 - t
+    weights = numpy.stack((s**3, 3 * s**2 * t, 3 * s * t**2, t**3), axis=1)
+    xy = numpy.einsum("pk,pkc->pc", weights, ctrl[piece]).tolist()
+    # the points of a segment end at the last step of its last piece
+    ends = ends[numpy.searchsorted(owner, numpy.arange(len(curved)), "right") - 1]
+
+    flat = {}
+    start = 0
+    for key, end in zip(curved, ends.tolist()):
+        flat[key] = xy[start:end]
+        start = end
+    result = []
+    for k, sub in enumerate(path):
+        new = [sub[0]]
+        for i in range(1, len(sub)):
+            points = flat.get((k, i))
+            if points is None:
+                new.append(sub[i])
+            else:
+                new.extend([point, point, point] for point in points)
+        result.append(new)
+    return result
+
+
+def chain_segments(coords, tolerance=0.0001):
+    """Join the x1, y1, x2, y2 line segments sharing end points into polylines,
+    yields (points, closed) with the open chains first"""
+    scale = 1.0 / tolerance
+    keys = []  # quantized start and end point per segment, x + y j
+    ends = {}  # quantized end point -> segments, popped as they are used
+    for i in range(0, len(coords), 4):
+        a = complex(round(coords[i] * scale), round(coords[i + 1] * scale))
+        b = complex(round(coords[i + 2] * scale), round(coords[i + 3] * scale))
+        keys.append(a)
+        keys.append(b)
+        ends.setdefault(a, []).append(i)
+        ends.setdefault(b, []).append(i)
+    for found in ends.values():
+        found.reverse()  # pop in segment order
+    odd = {node for node, found in ends.items() if len(found) % 2}
+    used = bytearray(len(coords) // 4)
+
+    def walk(node, points):
+        """Follow unused segments from node, return the last node"""
+        found = ends[node]
+        while True:
+            while found and used[found[-1] // 4]:
+                found.pop()
+            if not found:
+                return node
+            i = found.pop()
+            used[i // 4] = 1
+            if keys[i // 2] == node:
+                node = keys[i // 2 + 1]
+                points.append((coords[i + 2], coords[i + 3]))
+            else:
+                node = keys[i // 2]
+                points.append((coords[i], coords[i + 1]))
+            found = ends[node]
+
+    for loops in (False, True):
+        for i in range(0, len(coords), 4):
+            if used[i // 4]:
+                continue
+            a = keys[i // 2]
+            b = keys[i // 2 + 1]
+            start = (coords[i], coords[i + 1])
+            end = (coords[i + 2], coords[i + 3])
+            if not loops and a not in odd:
+                if b not in odd:
+                    continue
+                a, b = b, a
+                start, end = end, start
+            points = [start, end]
+            used[i // 4] = 1
+            closed = 0
+            if walk(b, points) != a:
+                before = []
+                walk(a, before)
+                points[:0] = before[::-1]
+            elif len(points) > 2:
+                points.pop()
+                closed = 1
+            yield points, closed
+
 
 class DxfOutlines(inkex.OutputExtension):
     def add_arguments(self, pars):
@@ -109,6 +352,9 @@ class DxfOutlines(inkex.OutputExtension):
         pars.add_argument("-R", "--ROBO", type=inkex.Boolean, default=False)
         pars.add_argument("-P", "--POLY", type=inkex.Boolean, default=False)
         pars.add_argument("-F", "--FLATTENBEZ", type=inkex.Boolean, default=False)
+        pars.add_argument("-M", "--MERGESPLINE", type=inkex.Boolean, default=False)
+        pars.add_argument("--PRIMITIVES", type=inkex.Boolean, default=True)
+        pars.add_argument("--flatness", type=float, default=0.1)  # mm
         pars.add_argument(
             "--unit_from_document", type=inkex.Boolean, default=True
         )  # px
@@ -116,74 +362,82 @@ class DxfOutlines(inkex.OutputExtension):
         pars.add_argument("--encoding", dest="char_encode", default="latin_1")
         pars.add_argument("--layer_option", default="all")
         pars.add_argument("--layer_name")
-
-        self.dxf = []
-        self.handle = 255  # handle for DXF ENTITY
+        pars.add_argument("--element_option", default="all")
+        pars.add_argument("--global_ids")
+        pars.add_argument("--diagnostics", default="off")
+        pars.add_argument("--cache_dir", default="")  # reuse text converted to paths
+        pars.add_argument("--dxf_format", default="ascii")  # ascii, binary
+        pars.add_argument("--compression", default="none")  # none, gzip, zip
+
+        self.dxf = None  # spooled output after the header, see save
+        self.handle = 255  # last handle allocated to a table record or entity
         self.layers = ["0"]
         self.layer = "0"  # mandatory layer
         self.layernames = []
         self.csp_old = [[0.0, 0.0]] * 4  # previous spline
-        self.d = [0.0]  # knot vector
-        self.poly = [[0.0, 0.0]]  # LWPOLYLINE data
+        self.robo = []  # control point coordinates of the current ROBO spline
+        self.merged = []  # control points of the current merged spline
+        self.segments = {}  # (layer, color) -> x1, y1, x2, y2 of LWPOLYLINE segments
+        self.skipped = set()  # elements left out by GlobalId selection
+        self.deferred = []  # (text or symbol clone, transform, layer) to convert
+        self.binary = False  # binary DXF, see dxf_encode
 
 
 
     def dxf_add(self, str):
-        self.dxf.append(str.encode(self.options.char_encode))
+        self.dxf.write(self.dxf_encode(str))
+
+    def dxf_encode(self, str):
+        if self.binary:
+            return ascii_to_binary(str, self.options.char_encode)
+        return str.encode(self.options.char_encode)
 
     def dxf_line(self, csp):
         """Draw a line in the DXF format"""
         self.handle += 1
+        self.diagnostics.count(self.layer)
+        if self.binary:
+            self.dxf.write(
+                binary_line(self.handle, self.layer, self.color, csp, self.options.char_encode)
+            )
+            return
         self.dxf_add(
             "  0\nLINE\n  5\n%x\n100\nAcDbEntity\n  8\n%s\n 62\n%d\n100\nAcDbLine\n"
-            % (self.handle, self.layer, self.color)
-        )
-        self.dxf_add(
             " 10\n%f\n 20\n%f\n 30\n0.0\n 11\n%f\n 21\n%f\n 31\n0.0\n"
-            % (csp[0][0], csp[0][1], csp[1][0], csp[1][1])
+            % (self.handle, self.layer, self.color, csp[0][0], csp[0][1], csp[1][0], csp[1][1])
         )
 
     def LWPOLY_line(self, csp):
-        if (
-            abs(csp[0][0] - self.poly[-1][0]) > 0.0001
-            or abs(csp[0][1] - self.poly[-1][1]) > 0.0001
-            or self.color_LWPOLY != self.color
-        ):  # THIS LINE IS NEW
-            self.LWPOLY_output()  # terminate current polyline
-            self.poly = [csp[0]]  # initiallize new polyline
-            self.color_LWPOLY = self.color
-            self.layer_LWPOLY = self.layer
-        self.poly.append(csp[1])
+        coords = self.segments.get((self.layer, self.color))
+        if coords is None:
+            coords = self.segments[self.layer, self.color] = array("d")
+        coords.extend((csp[0][0], csp[0][1], csp[1][0], csp[1][1]))
 
     def LWPOLY_output(self):
-        if len(self.poly) == 1:
-            return
-        self.handle += 1
-        closed = 1
-        if (
-            abs(self.poly[0][0] - self.poly[-1][0]) > 0.0001
-            or abs(self.poly[0][1] - self.poly[-1][1]) > 0.0001
-        ):
-            closed = 0
-        self.dxf_add(
-            "  0\nLWPOLYLINE\n  5\n%x\n100\nAcDbEntity\n  8\n%s\n 62\n%d\n100\nAcDbPolyline\n 90\n%d\n 70\n%d\n"
-            % (
-                self.handle,
-                self.layer_LWPOLY,
-                self.color_LWPOLY,
-                len(self.poly) - closed,
-                closed,
-            )
-        )
-        for i in range(len(self.poly) - closed):
-            self.dxf_add(
-                " 10\n%f\n 20\n%f\n 30\n0.0\n" % (self.poly[i][0], self.poly[i][1])
-            )
+        """Chain the buffered segments of each layer and color into LWPOLYLINEs"""
+        for (layer, color), coords in self.segments.items():
+            for points, closed in chain_segments(coords):
+                self.handle += 1
+                self.diagnostics.count(layer)
+                if self.binary:
+                    self.dxf.write(
+                        binary_lwpolyline(
+                            self.handle, layer, color, points, closed, self.options.char_encode
+                        )
+                    )
+                    continue
+                self.dxf_add(
+                    "  0\nLWPOLYLINE\n  5\n%x\n100\nAcDbEntity\n  8\n%s\n 62\n%d\n100\nAcDbPolyline\n 90\n%d\n 70\n%d\n"
+                    % (self.handle, layer, color, len(points), closed)
+                    + "".join(" 10\n%f\n 20\n%f\n 30\n0.0\n" % (x, y) for x, y in points)
+                )
+        self.segments = {}
 
     def dxf_spline(self, csp):
         knots = 8
         ctrls = 4
         self.handle += 1
+        self.diagnostics.count(self.layer)
         self.dxf_add(
             "  0\nSPLINE\n  5\n%x\n100\nAcDbEntity\n  8\n%s\n 62\n%d\n100\nAcDbSpline\n"
             % (self.handle, self.layer, self.color)
@@ -195,6 +449,77 @@ class DxfOutlines(inkex.OutputExtension):
         for i in csp:
             self.dxf_add(" 10\n%f\n 20\n%f\n 30\n0.0\n" % (i[0], i[1]))
 
+    def dxf_primitive(self, primitive):
+        """Write a CIRCLE, ARC or ELLIPSE of dxf_primitives"""
+        kind, center = primitive[:2]
+        self.handle += 1
+        self.diagnostics.count(self.layer)
+        entity = "  0\n%s\n  5\n%x\n100\nAcDbEntity\n  8\n%s\n 62\n%d\n" % (
+            kind,
+            self.handle,
+            self.layer,
+            self.color,
+        )
+        if kind == "ELLIPSE":
+            major, ratio = primitive[2:]
+            entity += (
+                "100\nAcDbEllipse\n 10\n%f\n 20\n%f\n 30\n0.0\n 11\n%f\n 21\n%f\n 31\n0.0\n"
+                " 40\n%f\n 41\n0.0\n 42\n%r\n"
+                % (center[0], center[1], major[0], major[1], ratio, FULL_TURN)
+            )
+        else:
+            entity += "100\nAcDbCircle\n 10\n%f\n 20\n%f\n 30\n0.0\n 40\n%f\n" % (
+                center[0],
+                center[1],
+                primitive[2],
+            )
+            if kind == "ARC":
+                entity += "100\nAcDbArc\n 50\n%f\n 51\n%f\n" % primitive[3:]
+        self.dxf_add(entity)
+
+    def MERGE_spline(self, csp):
+        """Append a Bézier segment to the current merged spline, or start a new
+        one if it does not continue it"""
+        if self.merged and (
+            abs(csp[0][0] - self.merged[-1][0]) > 0.0001
+            or abs(csp[0][1] - self.merged[-1][1]) > 0.0001
+            or self.layer != self.layer_MERGE
+            or self.color != self.color_MERGE
+        ):
+            self.MERGE_output()
+        if not self.merged:
+            self.merged.append(csp[0])
+            self.layer_MERGE = self.layer
+            self.color_MERGE = self.color
+        self.merged.extend(csp[1:])
+
+    def MERGE_output(self):
+        """Write the merged Bézier segments as one clamped cubic B-spline.
+        Interior knots of multiplicity 3 make every span the original segment."""
+        if not self.merged:
+            return
+        segments = (len(self.merged) - 1) // 3
+        knots = [0] * 4 + [i for i in range(1, segments) for _ in range(3)]
+        knots += [segments] * 4
+        self.handle += 1
+        self.diagnostics.count(self.layer_MERGE)
+        self.dxf_add(
+            "  0\nSPLINE\n  5\n%x\n100\nAcDbEntity\n  8\n%s\n 62\n%d\n100\nAcDbSpline\n"
+            % (self.handle, self.layer_MERGE, self.color_MERGE)
+        )
+        self.dxf_add(
+            " 70\n8\n 71\n3\n 72\n%d\n 73\n%d\n 74\n0\n"
+            % (len(knots), len(self.merged))
+        )
+        self.dxf_add("".join(" 40\n%d\n" % knot for knot in knots))
+        self.dxf_add(
+            "".join(
+                " 10\n%f\n 20\n%f\n 30\n0.0\n" % (point[0], point[1])
+                for point in self.merged
+            )
+        )
+        self.merged = []
+
     def ROBO_spline(self, csp):
         """this spline has zero curvature at the endpoints, as in ROBO-Master"""
         if (
@@ -207,27 +532,16 @@ class DxfOutlines(inkex.OutputExtension):
             > 0.001
         ):
             self.ROBO_output()  # terminate current spline
-            self.xfit = [csp[0][0]]  # initiallize new spline
-            self.yfit = [csp[0][1]]
-            self.d = [0.0]
+            self.robo = []  # initiallize new spline
             self.color_ROBO = self.color
             self.layer_ROBO = self.layer
-        self.xfit += 3 * [0.0]
-        self.yfit += 3 * [0.0]
-        self.d += 3 * [0.0]
-        for i in range(1, 4):
-            j = len(self.d) + i - 4
-            self.xfit[j] = get_fit(i / 3.0, csp, 0)
-            self.yfit[j] = get_fit(i / 3.0, csp, 1)
-            self.d[j] = self.d[j - 1] + bezier.pointdistance(
-                (self.xfit[j - 1], self.yfit[j - 1]), (self.xfit[j], self.yfit[j])
-            )
+        for point in csp:
+            self.robo.extend(point[:2])
         self.csp_old = csp
 
     def ROBO_output(self):
         try:
             import numpy
-            from numpy.linalg import solve
         except ImportError:
             inkex.errormsg(
                 _(
@@ -238,8 +552,12 @@ class DxfOutlines(inkex.OutputExtension):
             )
             return
 
-        if len(self.d) == 1:
+        if not self.robo:
             return
+        fit, d = get_fits(self.robo)
+        self.xfit = fit[:, 0].tolist()
+        self.yfit = fit[:, 1].tolist()
+        self.d = d.tolist()
         fits = len(self.d)
         ctrls = fits + 2
         knots = ctrls + 4
@@ -248,26 +566,32 @@ class DxfOutlines(inkex.OutputExtension):
         self.d += 6 * [0.0]  # pad with 3 duplicates at each end
         self.d[fits + 2] = self.d[fits + 1] = self.d[fits] = self.d[fits - 1]
 
-        solmatrix = numpy.zeros((ctrls, ctrls), dtype=float)
-        for i in range(fits):
-            solmatrix[i, i] = get_matrix(self.d, i, i)
-            solmatrix[i, i + 1] = get_matrix(self.d, i, i + 1)
-            solmatrix[i, i + 2] = get_matrix(self.d, i, i + 2)
-        solmatrix[fits, 0] = self.d[2] / self.d[fits - 1]  # curvature at start = 0
-        solmatrix[fits, 1] = -(self.d[1] + self.d[2]) / self.d[fits - 1]
-        solmatrix[fits, 2] = self.d[1] / self.d[fits - 1]
-        solmatrix[fits + 1, fits - 1] = (self.d[fits - 1] - self.d[fits - 2]) / self.d[
-            fits - 1
-        ]  # curvature at end = 0
-        solmatrix[fits + 1, fits] = (
-            self.d[fits - 3] + self.d[fits - 2] - 2 * self.d[fits - 1]
-        ) / self.d[fits - 1]
-        solmatrix[fits + 1, fits + 1] = (self.d[fits - 1] - self.d[fits - 3]) / self.d[
-            fits - 1
+        # The fit rows only use columns i to i + 2. With the start curvature
+        # row moved to the top and the end curvature row left at the bottom
+        # the matrix is banded, which solve_banded handles in linear time.
+        bands = get_matrix_bands(numpy.array(self.d), fits)
+        rows = [
+            {
+                0: self.d[2] / self.d[fits - 1],  # curvature at start = 0
+                1: -(self.d[1] + self.d[2]) / self.d[fits - 1],
+                2: self.d[1] / self.d[fits - 1],
+            }
         ]
-        xctrl = solve(solmatrix, self.xfit)
-        yctrl = solve(solmatrix, self.yfit)
+        for i, (a, b, c) in enumerate(zip(*(band.tolist() for band in bands))):
+            rows.append({i: a, i + 1: b, i + 2: c})
+        rows.append(
+            {
+                fits - 1: (self.d[fits - 1] - self.d[fits - 2])
+                / self.d[fits - 1],  # curvature at end = 0
+                fits: (self.d[fits - 3] + self.d[fits - 2] - 2 * self.d[fits - 1])
+                / self.d[fits - 1],
+                fits + 1: (self.d[fits - 1] - self.d[fits - 3]) / self.d[fits - 1],
+            }
+        )
+        rhs = [[0.0, 0.0]] + list(zip(self.xfit[:fits], self.yfit[:fits])) + [[0.0, 0.0]]
+        xctrl, yctrl = zip(*solve_banded(rows, rhs))
         self.handle += 1
+        self.diagnostics.count(self.layer_ROBO)
         self.dxf_add(
             "  0\nSPLINE\n  5\n%x\n100\nAcDbEntity\n  8\n%s\n 62\n%d\n100\nAcDbSpline\n"
             % (self.handle, self.layer_ROBO, self.color_ROBO)
@@ -295,33 +619,59 @@ class DxfOutlines(inkex.OutputExtension):
         if not isinstance(node, (PathElement, Rectangle, Line, Circle, Ellipse)):
             return
 
+        # Circles, ellipses and circular arcs replace the curve output
+        primitives = self.options.PRIMITIVES and not (
+            self.options.FLATTENBEZ or self.options.ROBO
+        )
+        transform = Transform(mat) @ node.transform
+        if primitives and isinstance(node, (Circle, Ellipse)):
+            primitive = ellipse_primitive(node, transform)
+            if primitive is not None:
+                self.dxf_primitive(primitive)
+                return
+
         # Transforming /after/ superpath is more reliable than before
         # because of some issues with arcs in transformations
-        path = node.path.to_superpath().transform(Transform(mat) @ node.transform)
+        path = node.path.to_superpath().transform(transform)
 
         # If Flatten Beziers is enabled, subdivide our beziers and
         # we'll later just ignore the curve and output flat lines
         if self.options.FLATTENBEZ:
-            bezier.cspsubdiv(path, 0.1)  # default to most detailed (0.1)
+            path = flatten_superpath(path, self.flatness)
 
         # Now output the path.
         for sub in path:
-            for i in range(len(sub) - 1):
+            i = 0
+            while i < len(sub) - 1:
                 s = sub[i]
                 e = sub[i + 1]
+                i += 1
                 # If flattening beziers, ignore curves and output flat lines
                 if (s[1] == s[2] and e[0] == e[1]) or self.options.FLATTENBEZ:
                     if self.options.POLY:
                         self.LWPOLY_line([s[1], e[1]])
                     else:
                         self.dxf_line([s[1], e[1]])
+                    continue
+                run = arc_run(sub, i - 1) if primitives else None
+                if run is not None:
+                    primitive, i = run
+                    self.dxf_primitive(primitive)
                 elif self.options.ROBO:
                     self.ROBO_spline([s[1], s[2], e[0], e[1]])
+                elif self.options.MERGESPLINE:
+                    self.MERGE_spline([s[1], s[2], e[0], e[1]])
                 else:
                     self.dxf_spline([s[1], s[2], e[0], e[1]])
 
     def process_clone(self, node):
         """Process a clone node, looking for internal paths"""
+        # get referenced node
+        refid = node.get("xlink:href")
+        refnode = self.svg.getElementById(refid[1:])
+        if isinstance(refnode, Symbol):
+            self.deferred.append((node, self.groupmat[-1], self.layer))
+            return
         trans = node.get("transform")
         x = node.get("x")
         y = node.get("y")
@@ -335,49 +685,67 @@ class DxfOutlines(inkex.OutputExtension):
         # push transform
         if trans or x or y:
             self.groupmat.append(Transform(self.groupmat[-1]) @ mat)
-        # get referenced node
-        refid = node.get("xlink:href")
-        refnode = self.svg.getElementById(refid[1:])
         if refnode is not None:
-            if isinstance(refnode, Group):
-                self.process_group(refnode)
-            elif isinstance(refnode, Use):
-                self.process_clone(refnode)
-            else:
-                self.process_shape(refnode, self.groupmat[-1])
+            self.process_node(refnode)
         # pop transform
         if trans or x or y:
             self.groupmat.pop()
 
+    def process_node(self, node):
+        """Process an element with the current transform and layer"""
+        if isinstance(node, Group):
+            self.process_group(node)
+        elif isinstance(node, Use):
+            self.process_clone(node)
+        elif isinstance(node, (TextElement, FlowRoot)):
+            self.deferred.append((node, self.groupmat[-1], self.layer))
+        else:
+            self.process_shape(node, self.groupmat[-1])
+
+    def add_layer(self, group):
+        """Add a layer to the LAYER table, return its DXF name or None when
+        the layer name option leaves it out"""
+        label = group.label
+        self.layernames.append(label.lower())
+        if self.options.layer_name and self.options.layer_option == "name":
+            if not label.lower() in self.options.layer_name:
+                return None
+        layer = label.replace(" ", "_")
+        if layer and layer not in self.layers:
+            self.layers.append(layer)
+        return layer
+
+    def skip_layer(self, group):
+        """Add the sublayers of a layer that is not exported to the LAYER table"""
+        for node in group.iterdescendants(inkex.addNS("g", "svg")):
+            if isinstance(node, Layer):
+                self.add_layer(node)
+
     def process_group(self, group):
         """Process group elements"""
         if isinstance(group, Layer):
+            layer = self.add_layer(group)
             style = group.style
             if (
                 style("display") == "none"
                 and self.options.layer_option
                 and self.options.layer_option == "visible"
-            ):
+            ) or layer is None:
+                self.skip_layer(group)
                 return
-            layer = group.label
-            if self.options.layer_name and self.options.layer_option == "name":
-                if not layer.lower() in self.options.layer_name:
-                    return
-
-            layer = layer.replace(" ", "_")
             if layer in self.layers:
+                # The polylines of the previous layer are complete
+                if self.options.POLY and layer != self.layer:
+                    self.LWPOLY_output()
                 self.layer = layer
         trans = group.get("transform")
         if trans:
             self.groupmat.append(Transform(self.groupmat[-1]) @ Transform(trans))
         for node in group:
+            if node in self.skipped:
+                continue
             try:
-                if isinstance(node, Group):
-                    self.process_group(node)
-                elif isinstance(node, Use):
-                    self.process_clone(node)
-                else:
-                    self.process_shape(node, self.groupmat[-1])
+                self.process_node(node)
             except RecursionError as e:
                 raise inkex.AbortExtension(
                     _(
@@ -387,6 +755,82 @@ class DxfOutlines(inkex.OutputExtension):
         if trans:
             self.groupmat.pop()
 
+    def text_key(self, node):
+        """Hash of a text element and the style it inherits, without its id:
+        BlenderBIM text has none and get_id() makes up a random one"""
+        source = copy.deepcopy(node)
+        source.attrib.pop("id", None)
+        key = hashlib.sha256(etree.tostring(source, with_tail=False))
+        key.update(str(node.specified_style()).encode("utf-8"))
+        return key.hexdigest()
+
+    def convert_deferred(self):
+        """Export the text and symbol clones put aside by the traversal.
+
+        They are drawn from outlines made by an Inkscape round trip, which
+        only runs when there is something to convert. With a cache directory
+        every converted text element is stored under the hash of its source,
+        and cached conversions are used without starting Inkscape.
+        """
+        # Outlines are only processed once, text they put aside again is dropped
+        deferred, self.deferred = self.deferred, []
+        texts = {node for node, _, _ in deferred if not isinstance(node, Use)}
+        converted = {}  # deferred element -> outlines
+        keys = {}  # text element -> hash, taken before get_id() sets an id
+        if self.options.cache_dir:
+            keys = {node: self.text_key(node) for node in texts}
+            for node, key in keys.items():
+                cached = os.path.join(self.options.cache_dir, key + ".svg")
+                if os.path.isfile(cached):
+                    with open(cached, "rb") as fhl:
+                        converted[node] = inkex.load_svg(fhl).getroot()
+            self.diagnostics.info(
+                "%d of %d text elements to convert", len(texts) - len(converted), len(texts)
+            )
+        missing = {}  # id -> element left to convert
+        for node, _, _ in deferred:
+            if node not in converted:
+                missing[node.get_id()] = node
+        if missing:
+            if keys:
+                os.makedirs(self.options.cache_dir, exist_ok=True)
+            self.preprocess(["flowRoot", "text"])
+            for node_id, node in missing.items():
+                path = self.svg.getElementById(node_id)
+                if path is None:
+                    continue
+                converted[node] = path
+                if node not in keys:
+                    continue
+                with tempfile.NamedTemporaryFile(
+                    dir=self.options.cache_dir, delete=False
+                ) as cached:
+                    cached.write(etree.tostring(path, with_tail=False))
+                os.replace(
+                    cached.name,
+                    os.path.join(self.options.cache_dir, keys[node] + ".svg"),
+                )
+        for node, mat, layer in deferred:
+            if node not in converted:
+                continue
+            if self.options.POLY and layer != self.layer:
+                self.LWPOLY_output()
+            self.layer = layer
+            self.groupmat.append(mat)
+            self.process_node(converted[node])
+            self.groupmat.pop()
+
+    def layer_table(self):
+        """LAYER table of the layers found by the traversal"""
+        table = ["  2\nLAYER\n  5\n2\n100\nAcDbSymbolTable\n 70\n%s\n" % len(self.layers)]
+        for layer in self.layers:
+            self.handle += 1
+            table.append(
+                "  0\nLAYER\n  5\n%x\n100\nAcDbSymbolTableRecord\n100\nAcDbLayerTableRecord\n  2\n%s\n 70\n0\n  6\nCONTINUOUS\n"
+                % (self.handle, layer)
+            )
+        return "".join(table)
+
     def save(self, stream):
         # Warn user if name match field is empty
         if (
@@ -401,10 +845,16 @@ class DxfOutlines(inkex.OutputExtension):
                 )
             )
 
-        if len(self.svg.xpath("//svg:use|//svg:flowRoot|//svg:text")) > 0:
-            self.preprocess(["flowRoot", "text"])
-        # Create layers from IfcClasses 
-        self.svg = class2layer(self.svg)
+        self.diagnostics = Diagnostics(self.options.diagnostics)
+        # Everything after the header is written to a temporary file as it is
+        # generated, the header follows once $HANDSEED is known
+        self.dxf = tempfile.TemporaryFile(buffering=BUFFER_SIZE)
+        self.binary = binary = self.options.dxf_format == "binary"
+        # Create layers from IfcClasses and look up the elements to leave out
+        layers, self.skipped, missing = export_layers(
+            self.svg, self.options.global_ids, self.options.element_option
+        )
+        self.diagnostics.info("%d layers from IfcClasses", len(layers))
         # Split user layer data into a list: "layerA,layerb,LAYERC" becomes ["layera", "layerb", "layerc"]
         if self.options.layer_name:
             self.options.layer_name = self.options.layer_name.lower().split(",")
@@ -417,44 +867,25 @@ class DxfOutlines(inkex.OutputExtension):
             unit = self.svg.document_unit
         else:
             unit = self.options.units
+        # Flattening tolerance in the unit of the DXF coordinates
+        self.flatness = convert_unit("%gmm" % self.options.flatness, coordinate_unit(self.svg))
         with open(self.get_resource("dxf14_header.txt"), "r") as fhl:
             header = fhl.read()
             unit_map = {"px": 0, "in": 1, "ft": 2, "mm": 4, "cm": 5, "m": 6}
             header = header.replace("<unit specifier>", str(unit_map.get(unit, 0)))
-            self.dxf_add(header)
-        for node in self.svg.xpath("//svg:g"):
-            if isinstance(node, Layer):
-                layer = node.label
-                self.layernames.append(layer.lower())
-                if (
-                    self.options.layer_name
-                    and self.options.layer_option
-                    and self.options.layer_option == "name"
-                    and not layer.lower() in self.options.layer_name
-                ):
-                    continue
-                layer = layer.replace(" ", "_")
-                if layer and layer not in self.layers:
-                    self.layers.append(layer)
-        self.dxf_add(
-            "  2\nLAYER\n  5\n2\n100\nAcDbSymbolTable\n 70\n%s\n" % len(self.layers)
-        )
-        for i in range(len(self.layers)):
-            self.dxf_add(
-                "  0\nLAYER\n  5\n%x\n100\nAcDbSymbolTableRecord\n100\nAcDbLayerTableRecord\n  2\n%s\n 70\n0\n  6\nCONTINUOUS\n"
-                % (i + 80, self.layers[i])
-            )
-        with open(self.get_resource("dxf14_style.txt"), "r") as fhl:
-            self.dxf_add(fhl.read())
-
         # Set toplevel transform
         scale = self.svg.inkscape_scale
         self.groupmat = [
             [[scale, 0.0, 0.0], [0.0, -scale, self.svg.viewbox_height * scale]]
         ]
+        # Layers, text and clones of symbols are found on the way, the tables
+        # are written with the header once the traversal is done
         self.process_group(self.svg)
+        self.convert_deferred()
         if self.options.ROBO:
             self.ROBO_output()
+        elif self.options.MERGESPLINE:
+            self.MERGE_output()
         if self.options.POLY:
             self.LWPOLY_output()
         with open(self.get_resource("dxf14_footer.txt"), "r") as fhl:
@@ -468,7 +899,22 @@ class DxfOutlines(inkex.OutputExtension):
             for layer in self.options.layer_name:
                 if layer not in self.layernames:
                     inkex.errormsg(_("Warning: Layer '{}' not found!").format(layer))
-        stream.write(b"".join(self.dxf))
+        for global_id in missing:
+            inkex.errormsg(_("Warning: GlobalId '{}' not found!").format(global_id))
+        self.diagnostics.summary()
+        name = member_name(self.document_path())
+        with container(stream, self.options.compression, name) as output:
+            if binary:
+                output.write(SENTINEL)
+            tables = self.layer_table()
+            with open(self.get_resource("dxf14_style.txt"), "r") as fhl:
+                tables += fhl.read()
+            # $HANDSEED has to be above every handle
+            header = header.replace("<handle seed>", "%X" % (self.handle + 1))
+            output.write(self.dxf_encode(header + tables))
+            self.dxf.seek(0)
+            shutil.copyfileobj(self.dxf, output, BUFFER_SIZE)
+        self.dxf.close()
 
 
 if __name__ == "__main__":
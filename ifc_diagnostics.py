@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+Leveled diagnostics shared by the IfcClass extensions.
+
+Every message goes through Inkscape's message window, which is slow to format
+and display on big drawings, so diagnostics are off by default.  Disabled
+methods are swapped for a no-op when the object is built, and hot loops can
+test the level flags before computing expensive arguments.
+
+Levels: off, summary (per-layer entity counts once at the end), info, debug.
+"""
+
+import inkex
+
+LEVELS = ("off", "summary", "info", "debug")
+
+
+def _skip(*args):
+    """Disabled diagnostics call"""
+
+
+class Diagnostics:
+    def __init__(self, level="off"):
+        rank = LEVELS.index(level) if level in LEVELS else 0
+        self.summarizing = rank >= 1
+        self.informing = rank >= 2
+        self.debugging = rank >= 3
+        self.counts = {}
+        if not self.summarizing:
+            self.count = _skip
+        if not self.informing:
+            self.info = _skip
+        if not self.debugging:
+            self.debug = _skip
+
+    def debug(self, msg, *args):
+        inkex.utils.errormsg(msg % args if args else msg)
+
+    def info(self, msg, *args):
+        inkex.utils.errormsg(msg % args if args else msg)
+
+    def count(self, layer, number=1):
+        """Add exported entities to the per-layer summary"""
+        self.counts[layer] = self.counts.get(layer, 0) + number
+
+    def summary(self):
+        """Report the per-layer entity counts"""
+        if not self.summarizing:
+            return
+        for layer, number in self.counts.items():
+            inkex.utils.errormsg("%s: %d entities" % (layer, number))
+        inkex.utils.errormsg("Total: %d entities" % sum(self.counts.values()))
@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+Shared IfcClass partitioning used by the class2layer effect and the DXF exporters.
+
+BlenderBIM writes the IFC class of every product into the ``class`` attribute
+(``class="IfcWall material-null projection"``).  The functions below walk the
+document once, index every classed element by its IfcClass and then move each
+bucket into its own Inkscape layer in bulk.  stream_class2layer does the same
+for documents too large to load, reading and writing them incrementally.
+"""
+
+import hashlib
+import re
+import shutil
+import tempfile
+
+from lxml import etree
+from inkex import Group, Layer, TextElement, addNS, NSS
+
+IFC_PREFIX = "Ifc"
+GLOBALID_PREFIX = "GlobalId-"
+GLOBALID_PATTERN = re.compile(r"[0-3][0-9A-Za-z_$]{21}")  # compressed IFC GUID
+# Bare GUID tokens are left out, they also name shared type and material objects
+IFC_GUID_ATTR = "{http://www.ifcopenshell.org/ns}guid"  # ifc:guid on product groups
+FINGERPRINT_ATTR = "data-ifc-class-fingerprint"
+
+
+def get_ifc_class(element):
+    """Return the first Ifc* token of the element class attribute, or None"""
+    classes = element.attrib.get("class")
+    if not classes or IFC_PREFIX not in classes:
+        return None
+    for token in classes.split():
+        if token.startswith(IFC_PREFIX):
+            return token
+    return None
+
+
+def get_global_ids(element):
+    """Return the IFC GlobalIds of the element from its GlobalId- class tokens
+    and ifc:guid"""
+    global_ids = []
+    for token in (element.attrib.get("class") or "").split():
+        if not token.startswith(GLOBALID_PREFIX):
+            continue
+        token = token[len(GLOBALID_PREFIX):]
+        if GLOBALID_PATTERN.fullmatch(token) and token not in global_ids:
+            global_ids.append(token)
+    guid = element.attrib.get(IFC_GUID_ATTR)
+    if guid and guid not in global_ids:
+        global_ids.append(guid)
+    return global_ids
+
+
+class GlobalIdIndex:
+    """GlobalId -> elements and IfcClass -> GlobalIds, filled by partition()"""
+
+    def __init__(self):
+        self.elements = {}
+        self.classes = {}
+
+    def add(self, IfcClass, element, global_ids):
+        for global_id in global_ids:
+            elements = self.elements.setdefault(global_id, [])
+            if not elements or elements[-1] is not element:
+                elements.append(element)
+            self.classes.setdefault(IfcClass, {})[global_id] = None
+
+    def find(self, global_ids):
+        """Return the set of elements of the given GlobalIds, unknown ones are ignored"""
+        found = set()
+        for global_id in global_ids:
+            found.update(self.elements.get(global_id, ()))
+        return found
+
+    def global_ids(self, IfcClass):
+        """Return the GlobalIds of an IfcClass in document order"""
+        return list(self.classes.get(IfcClass, ()))
+
+    def skipped(self, layers, global_ids, include=True):
+        """Return the layered elements an export has to skip to keep only (include)
+        or to leave out (exclude) the elements of the given GlobalIds"""
+        found = self.find(global_ids)
+        if not include:
+            return found
+        return {element for layer in layers.values() for element in layer} - found
+
+
+def find_text_parent(element):
+    """Find the parent text element if this element is a child of a text element"""
+    parent = element.getparent()
+    while parent is not None:
+        if isinstance(parent, TextElement):
+            return parent
+        parent = parent.getparent()
+    return None
+
+
+def find_layers(svg):
+    """Return the IfcClass -> layer dict of the Ifc layers already in the document"""
+    layers = {}
+    for child in svg:
+        if isinstance(child, Group) and child.get("inkscape:groupmode") == "layer":
+            label = child.get("inkscape:label")
+            if label and label.startswith(IFC_PREFIX):
+                layers.setdefault(label, child)
+    return layers
+
+
+def fingerprint(svg, text_parents=False):
+    """Hash of every class attribute in document order"""
+    classes = svg.xpath("//@class")
+    classes.append(str(text_parents))
+    return hashlib.sha1("\n".join(classes).encode("utf-8")).hexdigest()
+
+
+def partition(svg, text_parents=False, layers=None, index=None):
+    """Walk the document once and return an IfcClass -> [elements] dict.
+
+    Classes and elements keep document order. With text_parents, classed
+    tspan/tref children are replaced by their enclosing text element so the
+    whole text is moved, each text element only once. Elements that already
+    sit in their layer from the IfcClass -> layer dict are left out.
+    If a GlobalIdIndex is given, it is filled in the same pass.
+    """
+    layers = layers or {}
+    moves = {}
+    seen = set()
+    for element in svg.iterdescendants(etree.Element):
+        IfcClass = get_ifc_class(element)
+        if IfcClass is None:
+            continue
+        if index is not None:
+            global_ids = get_global_ids(element)
+        if text_parents:
+            text_parent = find_text_parent(element)
+            if text_parent is not None:
+                element = text_parent
+        if index is not None:
+            index.add(IfcClass, element, global_ids)
+        if text_parents:
+            if element in seen:
+                continue
+            seen.add(element)
+        if element.getparent() is layers.get(IfcClass):
+            continue
+        moves.setdefault(IfcClass, []).append(element)
+    return moves
+
+
+def add_layer(svg, IfcClass):
+    """Append a new Inkscape layer named after the IfcClass"""
+    # Built as a Layer so exporters see it as one: the id cache keeps the
+    # element alive and with it the class it was created with
+    layer = svg.add(Layer(id=IfcClass))
+    layer.set("inkscape:label", IfcClass)
+    return layer
+
+
+def class2layer(svg, text_parents=False, index=None, fingerprinted=True):
+    """Move every Ifc classed element into a layer named after its IfcClass.
+
+    Layers from an earlier run are reused and only the elements that are not in
+    their layer yet are moved. The class attribute fingerprint stored on the
+    root lets a re-run on an unchanged document return straight away, unless a
+    GlobalIdIndex has to be filled. Exporters that discard the document after
+    one run pass fingerprinted=False to skip the fingerprint walks.
+
+    Returns an IfcClass -> layer dict in order of first appearance.
+    """
+    layers = find_layers(svg)
+    stored = svg.get(FINGERPRINT_ATTR) if fingerprinted else None
+    if index is None and stored is not None and stored == fingerprint(svg, text_parents):
+        return layers
+    moves = partition(svg, text_parents, layers, index)
+    for IfcClass, elements in moves.items():
+        layer = layers.get(IfcClass)
+        if layer is None:
+            layer = layers[IfcClass] = add_layer(svg, IfcClass)
+        # Plain lxml move: the elements stay in the same document, so the
+        # per-element id cache bookkeeping of inkex append/extend is not needed
+        etree.ElementBase.extend(layer, elements)
+    if fingerprinted:
+        svg.set(FINGERPRINT_ATTR, fingerprint(svg, text_parents))
+    return layers
+
+
+def export_layers(svg, global_ids="", element_option="all"):
+    """class2layer() for an exporter that does not save the document back.
+
+    Returns the layers, the layered elements to skip to keep only ("include")
+    or to leave out ("exclude") the comma separated GlobalIds, and the
+    GlobalIds that are not in the document.
+    """
+    selected = []
+    if global_ids and element_option in ("include", "exclude"):
+        selected = [g.strip() for g in global_ids.split(",") if g.strip()]
+    # The index is only needed to select elements
+    index = GlobalIdIndex() if selected else None
+    layers = class2layer(svg, index=index, fingerprinted=False)
+    if not selected:
+        return layers, set(), []
+    skipped = index.skipped(layers, selected, element_option == "include")
+    missing = [global_id for global_id in selected if global_id not in index.elements]
+    return layers, skipped, missing
+
+
+def _spool(element, buckets, IfcClass=None):
+    """Write a classed element (with its tail) to the temporary file of its
+    IfcClass, an unclassed one to the file of IfcClass.
+
+    Classed descendants are spooled to their own layers, as class2layer would
+    move them out of the element.  They are serialized innermost first, each
+    before it is detached: a detached element loses the default namespace of
+    its ancestors and would be written with an ns0: prefix.
+    """
+    nested = [node for node in element.iterdescendants(etree.Element) if get_ifc_class(node)]
+    serialized = {}
+    for node in reversed(nested):
+        serialized[node] = etree.tostring(node, encoding="utf-8", xml_declaration=False)
+        node.getparent().remove(node)
+    serialized[element] = etree.tostring(element, encoding="utf-8", xml_declaration=False)
+    for node in [element] + nested:
+        node_class = get_ifc_class(node)
+        bucket = _bucket(buckets, node_class or IfcClass)
+        bucket[0].write(serialized[node])
+        bucket[1] += node_class is not None
+
+
+def _bucket(buckets, IfcClass):
+    """[temporary file, element count] of an IfcClass, created on first use"""
+    if IfcClass not in buckets:
+        buckets[IfcClass] = [tempfile.TemporaryFile(), 0]
+    return buckets[IfcClass]
+
+
+def _layer_class(node):
+    """IfcClass of an Ifc layer as find_layers sees it, or None"""
+    if node.tag != addNS("g", "svg") or node.get(addNS("groupmode", "inkscape")) != "layer":
+        return None
+    label = node.get(addNS("label", "inkscape"))
+    return label if label and label.startswith(IFC_PREFIX) else None
+
+
+def stream_class2layer(source, output):
+    """Streaming class2layer for documents too large to load.
+
+    Reads source with iterparse and writes the layered document to the binary
+    output stream as it goes.  Elements that stay in place are written and
+    cleared as soon as they are complete, classed elements are spooled to one
+    temporary file per IfcClass and copied into their layers before the root
+    closes, so only the element being processed is held in memory.
+
+    Ifc layers of an earlier run are reused: their content is spooled to the
+    file of their IfcClass and they are written again with the new layers, so
+    a second run gives the same document.  The class fingerprint of the
+    in-memory class2layer is dropped, it would not match the moved elements.
+
+    Returns an IfcClass -> element count dict in order of first appearance.
+    """
+    buckets = {}
+    stack = []  # [element, context, text written, reused layer IfcClass] of the open elements
+    pending = None  # finished node whose tail is only known at the next event
+    capture = None  # classed element being parsed
+    root_nsmap = None  # namespaces declared on the written root
+    reused = set()  # IfcClasses of the layers of an earlier run
+    events = etree.iterparse(
+        source, events=("start", "end", "comment", "pi"), huge_tree=True
+    )
+    with etree.xmlfile(output, encoding="utf-8") as xf:
+        xf.write_declaration()
+        for event, node in events:
+            if capture is not None:
+                if event == "end" and node is capture:
+                    pending, capture = node, None
+                continue
+
+            # The tail of the previous node and the text of the parent are complete
+            if pending is not None:
+                parent = pending.getparent()
+                layer_class = stack[-1][3] if stack else None
+                if not isinstance(pending.tag, str):
+                    xf.write(pending)  # comment or processing instruction
+                elif get_ifc_class(pending) or layer_class:
+                    _spool(pending, buckets, layer_class)
+                elif pending.tail:
+                    xf.write(pending.tail)
+                if parent is not None:
+                    parent.remove(pending)
+                pending = None
+            if stack and not stack[-1][2]:
+                if stack[-1][0].text:
+                    xf.write(stack[-1][0].text)
+                stack[-1][2] = True
+
+            if event in ("comment", "pi"):
+                pending = node
+            elif event == "start":
+                if get_ifc_class(node) or (stack and stack[-1][3]):
+                    capture = node
+                    continue
+                IfcClass = _layer_class(node) if len(stack) == 1 else None
+                if IfcClass is not None and IfcClass not in reused:
+                    # Not written here, its content is spooled and it is
+                    # written with the new layers
+                    reused.add(IfcClass)
+                    _bucket(buckets, IfcClass)
+                    stack.append([node, None, True, IfcClass])
+                    continue
+                if stack:
+                    inherited = stack[-1][0].nsmap
+                    nsmap = {
+                        prefix: uri
+                        for prefix, uri in node.nsmap.items()
+                        if inherited.get(prefix) != uri
+                    }
+                else:
+                    nsmap = root_nsmap = dict(node.nsmap)
+                    nsmap.setdefault("inkscape", NSS["inkscape"])
+                attrib = dict(node.attrib)
+                if not stack:
+                    attrib.pop(FINGERPRINT_ATTR, None)
+                context = xf.element(node.tag, attrib, nsmap=nsmap or None)
+                context.__enter__()
+                stack.append([node, context, False, None])
+            else:
+                if len(stack) == 1:
+                    for IfcClass, (spooled, _) in buckets.items():
+                        attrib = {
+                            "id": IfcClass,
+                            addNS("groupmode", "inkscape"): "layer",
+                            addNS("label", "inkscape"): IfcClass,
+                        }
+                        # With the namespaces of the root, the inkscape prefix
+                        # is not redeclared as ns0, ns1, ...
+                        with xf.element(addNS("g", "svg"), attrib, nsmap=root_nsmap):
+                            xf.flush()
+                            spooled.seek(0)
+                            shutil.copyfileobj(spooled, output)
+                        spooled.close()
+                context = stack.pop()[1]
+                if context is not None:
+                    context.__exit__(None, None, None)
+                pending = node
+    return {IfcClass: count for IfcClass, (_, count) in buckets.items()}
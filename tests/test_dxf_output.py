@@ -0,0 +1,20 @@
+from dxf_output import ascii_to_binary, binary_line, binary_lwpolyline
+
+
+def test_binary_line_as_tags():
+    csp = [[0.1, -2.5], [1e6 / 3, 7.0]]
+    text = (
+        "  0\nLINE\n  5\n1a\n100\nAcDbEntity\n  8\nIfcWäll\n 62\n3\n100\nAcDbLine\n"
+        " 10\n%r\n 20\n%r\n 30\n0.0\n 11\n%r\n 21\n%r\n 31\n0.0\n"
+        % (csp[0][0], csp[0][1], csp[1][0], csp[1][1])
+    )
+    assert binary_line(0x1A, "IfcWäll", 3, csp, "latin_1") == ascii_to_binary(text, "latin_1")
+
+
+def test_binary_lwpolyline_as_tags():
+    points = [(0.0, 0.0), (1 / 3, 2.0), (4.0, -1 / 7)]
+    text = (
+        "  0\nLWPOLYLINE\n  5\nff\n100\nAcDbEntity\n  8\nIfcSlab\n 62\n256\n100\nAcDbPolyline\n"
+        " 90\n3\n 70\n1\n"
+    ) + "".join(" 10\n%r\n 20\n%r\n 30\n0.0\n" % point for point in points)
+    assert binary_lwpolyline(0xFF, "IfcSlab", 256, points, 1, "utf-8") == ascii_to_binary(text, "utf-8")
@@ -0,0 +1,117 @@
+import io
+import math
+
+import pytest
+from inkex import Circle, Ellipse, PathElement, Transform
+
+from dxf_primitives import arc_run, ellipse_primitive
+from ifc2layer2dxf import DxfOutlines
+
+# SVG user units to DXF coordinates of a 100 unit high drawing, y up
+FLIP = Transform("translate(0, 100) scale(1, -1)")
+
+
+def same_angle(a, b):
+    return abs((a - b + 180) % 360 - 180) < 1e-6
+
+
+def superpath(d, transform=FLIP):
+    return PathElement.new(d).path.to_superpath().transform(transform)
+
+
+def test_circle():
+    circle = Circle.new(center=(10, 20), radius=5)
+    kind, center, radius = ellipse_primitive(circle, FLIP)
+    assert kind == "CIRCLE"
+    assert center == pytest.approx((10, 80))
+    assert radius == pytest.approx(5)
+
+
+def test_round_ellipse_is_a_circle():
+    ellipse = Ellipse.new(center=(0, 0), radius=(4, 2))
+    assert ellipse_primitive(ellipse, Transform("scale(1, 2)"))[0] == "CIRCLE"
+
+
+def test_full_circle_path():
+    primitive, stop = arc_run(superpath("M 60,50 A 10,10 0 1 1 40,50 A 10,10 0 1 1 60,50")[0], 0)
+    assert primitive[0] == "CIRCLE"
+    assert primitive[1] == pytest.approx((50, 50))
+    assert primitive[2] == pytest.approx(10)
+
+
+@pytest.mark.parametrize(
+    "d, start, end",
+    [
+        # Clockwise on screen is clockwise in the flipped DXF coordinates:
+        # the arc runs counterclockwise from the end point to the start point
+        ("M 60,50 A 10,10 0 0 1 50,60", 270, 0),
+        ("M 60,50 A 10,10 0 1 1 50,40", 90, 0),
+        # Counterclockwise on screen keeps its start point
+        ("M 60,50 A 10,10 0 0 0 50,40", 0, 90),
+    ],
+)
+def test_arc_angles_under_the_y_flip(d, start, end):
+    sub = superpath(d)[0]
+    (kind, center, radius, angle, stop_angle), stop = arc_run(sub, 0)
+    assert kind == "ARC"
+    assert stop == len(sub) - 1
+    assert center == pytest.approx((50, 50))
+    assert radius == pytest.approx(10)
+    assert same_angle(angle, start)
+    assert same_angle(stop_angle, end)
+
+
+def test_skewed_circle_is_an_ellipse():
+    circle = Circle.new(center=(10, 20), radius=5)
+    transform = FLIP @ Transform("skewX(30)")
+    kind, center, major, ratio = ellipse_primitive(circle, transform)
+    assert kind == "ELLIPSE"
+    assert center == pytest.approx(tuple(transform.apply_to_point((10, 20))))
+    assert 0 < ratio < 1
+    # Every transformed point of the circle is on the ellipse
+    length = math.hypot(*major)
+    axis = (major[0] / length, major[1] / length)
+    for step in range(12):
+        t = step * math.pi / 6
+        point = transform.apply_to_point((10 + 5 * math.cos(t), 20 + 5 * math.sin(t)))
+        dx, dy = point.x - center[0], point.y - center[1]
+        along = (dx * axis[0] + dy * axis[1]) / length
+        across = (dy * axis[0] - dx * axis[1]) / (length * ratio)
+        assert along * along + across * across == pytest.approx(1)
+
+
+def test_flattened_ellipse_is_no_primitive():
+    assert ellipse_primitive(Circle.new(center=(0, 0), radius=5), Transform("scale(1, 0)")) is None
+
+
+@pytest.mark.parametrize(
+    "d",
+    [
+        "M 0,0 C 0,0 10,10 10,10",  # both handles zero length
+        "M 10,0 C 10,0 0,4.5 0,10",  # zero length start handle
+        "M 0,0 L 10,0",
+    ],
+)
+def test_zero_length_handles_fall_back(d):
+    assert arc_run(superpath(d)[0], 0) is None
+
+
+def test_export_arcs_and_splines(tmp_path):
+    path = tmp_path / "drawing.svg"
+    path.write_text(
+        """<svg xmlns="http://www.w3.org/2000/svg" width="100mm" height="100mm"
+ viewBox="0 0 100 100"><g class="IfcWall"><path class="IfcWall"
+ d="M 60,50 A 10,10 0 0 1 50,60 M 10,0 C 10,0 0,4.5 0,10"/></g></svg>"""
+    )
+    output = io.BytesIO()
+    DxfOutlines().run([str(path)], output=output)
+    tags = output.getvalue().decode("latin_1").split("\n")
+    pairs = [(code.strip(), value) for code, value in zip(tags[0::2], tags[1::2])]
+    kinds = [value for code, value in pairs if code == "0"]
+    assert kinds.count("ARC") == 1
+    assert kinds.count("SPLINE") == 1
+    arc = pairs.index(("0", "ARC"))
+    tags = dict(pairs[arc + 1 : arc + 13])
+    assert (float(tags["10"]), float(tags["20"]), float(tags["40"])) == pytest.approx((50, 50, 10))
+    assert same_angle(float(tags["50"]), 270)
+    assert same_angle(float(tags["51"]), 0)
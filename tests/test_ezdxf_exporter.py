@@ -0,0 +1,99 @@
+import ast
+import gzip
+import io
+import os
+import zipfile
+
+import ezdxf
+
+import ezdxf_exporter
+from ezdxf_exporter import EzDxfExporter
+
+SVG = """<svg xmlns="http://www.w3.org/2000/svg" width="100mm" height="100mm"
+ viewBox="0 0 100 100"><g class="IfcWall"><path class="IfcWall" d="M 0,0 L 50,20 L 80,90"/>
+ </g><g class="IfcDoor"><rect class="IfcDoor" x="10" y="10" width="20" height="30"/></g></svg>"""
+
+
+def export(tmp_path, svg, *args):
+    path = tmp_path / "drawing.svg"
+    path.write_text(svg)
+    output = io.BytesIO()
+    EzDxfExporter().run([*args, str(path)], output=output)
+    return output.getvalue()
+
+
+def header(dxf):
+    """$NAME -> value of the header variables, as written"""
+    tags = dxf.decode("utf-8").split("\n")
+    pairs = list(zip(tags[0::2], tags[1::2]))
+    return {
+        name: pairs[i + 1][1]
+        for i, (code, name) in enumerate(pairs)
+        if code.strip() == "9"
+    }
+
+
+def test_identical_input_gives_identical_bytes(tmp_path):
+    first = export(tmp_path, SVG)
+    assert export(tmp_path, SVG) == first
+    # Without flipping the ezdxf testing switch for the whole process
+    assert not ezdxf.options.write_fixed_meta_data_for_testing
+    variables = header(first)
+    assert variables["$TDCREATE"] == variables["$TDUPDATE"] == "2451545.0"
+    assert variables["$FINGERPRINTGUID"] != "{00000000-0000-0000-0000-000000000000}"
+    assert variables["$VERSIONGUID"] != variables["$FINGERPRINTGUID"]
+    # The GUIDs follow the content
+    other = header(export(tmp_path, SVG.replace("80,90", "80,91")))
+    assert other["$VERSIONGUID"] != variables["$VERSIONGUID"]
+
+
+def test_entities_on_their_ifcclass_layer(tmp_path):
+    doc = ezdxf.read(io.StringIO(export(tmp_path, SVG).decode("utf-8")))
+    references = doc.modelspace().query("INSERT")
+    assert sorted(insert.dxf.layer for insert in references) == ["IfcDoor", "IfcWall"]
+
+
+def test_untested_ezdxf_writes_with_drawing_write(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(ezdxf, "version", (0, 17, 2, "release"))
+    doc = ezdxf.read(io.StringIO(export(tmp_path, SVG).decode("utf-8")))
+    assert "untested" in capsys.readouterr().err
+    assert len(doc.modelspace().query("INSERT")) == 2
+
+
+def test_cached_container_names_the_document(tmp_path, monkeypatch):
+    cache = "--cache_dir=%s" % (tmp_path / "cache")
+    written = []
+    write_binary_data = ezdxf_exporter.write_binary_data
+    monkeypatch.setattr(
+        ezdxf_exporter,
+        "write_binary_data",
+        lambda *args: written.append(args[4]) or write_binary_data(*args),
+    )
+    for name in ("first", "second"):
+        # Inkscape passes the location of the saved document
+        monkeypatch.setenv("DOCUMENT_PATH", str(tmp_path / (name + ".svg")))
+        archive = export(tmp_path, SVG, cache, "--compression=zip")
+        assert zipfile.ZipFile(io.BytesIO(archive)).namelist() == [name + ".dxf"]
+        compressed = export(tmp_path, SVG, cache, "--compression=gzip")
+        assert (name + ".dxf\0").encode() in compressed[:30]
+        assert gzip.decompress(compressed).startswith(b"  0\nSECTION")
+        # Exported again, the cached container is copied as it is
+        assert export(tmp_path, SVG, cache, "--compression=zip") == archive
+        assert export(tmp_path, SVG, cache, "--compression=gzip") == compressed
+    assert written == ["zip", "gzip"] * 2
+    assert len(os.listdir(tmp_path / "cache")) == 4
+
+
+def test_cache_key_covers_the_local_imports():
+    with open(ezdxf_exporter.__file__) as fhl:
+        tree = ast.parse(fhl.read())
+    here = os.path.dirname(ezdxf_exporter.__file__)
+    imported = {
+        node.module if isinstance(node, ast.ImportFrom) else alias.name
+        for node in ast.walk(tree)
+        if isinstance(node, (ast.Import, ast.ImportFrom))
+        for alias in node.names
+    }
+    local = {name for name in imported if os.path.isfile(os.path.join(here, name + ".py"))}
+    assert local
+    assert local <= set(ezdxf_exporter.LOCAL_MODULES)
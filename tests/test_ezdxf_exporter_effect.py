@@ -0,0 +1,79 @@
+import ezdxf
+import pytest
+
+from ezdxf_exporter_batch import export_drawing
+from ezdxf_exporter_effect import EzDxfExporter
+
+SVG = """<svg xmlns="http://www.w3.org/2000/svg" width="100mm" height="100mm"
+ viewBox="0 0 100 100"><g class="IfcWall"><path class="IfcWall" d="M 0,0 L 50,20 L 80,90"/>
+ <path class="IfcWall" d="M 10,10 C 20,0 30,20 40,10 L 40,40 Z"/></g>
+ <rect class="IfcDoor" x="10" y="10" width="20" height="30"/>
+ <circle class="IfcColumn" cx="70" cy="30" r="5"/>
+ <g class="IfcSlab"><path class="IfcSlab" d="M 60,50 A 10,10 0 0 1 50,60 L 50,80"/></g>
+ <text class="IfcSpace" x="20" y="80">Room</text></svg>"""
+
+OPTIONS = [
+    {"IfcClass": IfcClass, "LayerName": "A-" + IfcClass[3:].upper(), "Color": color,
+     "Lineweight": 0, "Linetype": "Continuous"}
+    for color, IfcClass in enumerate(("IfcWall", "IfcDoor", "IfcColumn", "IfcSlab", "IfcSpace"), 1)
+]
+
+
+def export(tmp_path, svg, jobs=1, polylines=False, options=OPTIONS):
+    path = tmp_path / "drawing.svg"
+    path.write_text(svg)
+    dxf_path = tmp_path / ("drawing-%d.dxf" % jobs)
+    export_drawing(str(path), options, str(dxf_path), polylines=polylines, jobs=jobs)
+    return dxf_path.read_bytes()
+
+
+@pytest.mark.parametrize("polylines", [False, True])
+def test_jobs_give_identical_output(tmp_path, monkeypatch, polylines):
+    # Fixed header dates and GUIDs, the rest of the file follows the entities
+    monkeypatch.setattr(ezdxf.options, "write_fixed_meta_data_for_testing", True)
+    parallel = []
+    extract_parallel = EzDxfExporter.extract_parallel
+    monkeypatch.setattr(
+        EzDxfExporter,
+        "extract_parallel",
+        lambda self, *args: parallel.append(self.options.jobs) or extract_parallel(self, *args),
+    )
+    sequential = export(tmp_path, SVG, polylines=polylines)
+    assert export(tmp_path, SVG, jobs=2, polylines=polylines) == sequential
+    assert parallel == [2]
+    # One IfcClass left out of the export
+    assert export(tmp_path, SVG, jobs=2, polylines=polylines, options=OPTIONS[1:]) == export(
+        tmp_path, SVG, polylines=polylines, options=OPTIONS[1:]
+    )
+    doc = ezdxf.readfile(str(tmp_path / "drawing-1.dxf"))
+    assert {entity.dxf.layer for entity in doc.modelspace()} == {
+        "A-DOOR", "A-COLUMN", "A-SLAB", "A-SPACE"
+    }
+
+
+CLOSED_SVG = """<svg xmlns="http://www.w3.org/2000/svg" width="100mm" height="100mm"
+ viewBox="0 0 100 100"><g class="IfcWall">
+ <rect class="IfcWall" x="10" y="10" width="20" height="30"/>
+ <path class="IfcWall" d="M 50,0 L 60,0 L 60,10 L 50,0"/>
+ <path class="IfcWall" d="M 0,50 L 10,50 L 10,60"/>
+ <path class="IfcWall" d="M 0,90 L 10,90 L 0,90"/></g></svg>"""
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_closed_subpaths_are_closed_polylines(tmp_path, jobs):
+    export(tmp_path, CLOSED_SVG, jobs=jobs, polylines=True)
+    doc = ezdxf.readfile(str(tmp_path / ("drawing-%d.dxf" % jobs)))
+    polylines = [
+        (entity.dxf.flags, [tuple(round(c, 6) for c in point) for point in entity.get_points("xy")])
+        for entity in doc.modelspace().query("LWPOLYLINE")
+    ]
+    # DXF y up from the bottom of the 100 mm page
+    assert polylines == [
+        # rect, closed by Z: 4 vertices
+        (1, [(10, 90), (30, 90), (30, 60), (10, 60)]),
+        # back to the start without Z
+        (1, [(50, 100), (60, 100), (60, 90)]),
+        (0, [(0, 50), (10, 50), (10, 40)]),
+        # Two segments back and forth are no closed outline
+        (0, [(0, 10), (10, 10), (0, 10)]),
+    ]
@@ -0,0 +1,310 @@
+import io
+import math
+
+import numpy
+import pytest
+from inkex import PathElement
+from numpy.linalg import LinAlgError
+
+from ifc2layer2dxf import DxfOutlines, chain_segments, solve_banded
+
+# BlenderBIM writes drawings in mm without a namedview: document_unit is px,
+# the coordinates are mm at inkscape_scale 1
+MM_SVG = """<svg xmlns="http://www.w3.org/2000/svg" width="400mm" height="400mm"
+ viewBox="0 0 400 400"><g class="IfcWall"><path class="IfcWall"
+ d="M 0,0 C 100,300 300,-200 400,200"/></g></svg>"""
+
+# Three Bézier segments, the first one alone for a single segment spline
+ROBO_SVG = """<svg xmlns="http://www.w3.org/2000/svg" width="100mm" height="100mm"
+ viewBox="0 0 100 100"><g class="IfcWall"><path class="IfcWall"
+ d="M 10,10 C 20,40 40,40 50,20%s"/></g></svg>"""
+ROBO_SEGMENTS = " C 60,0 80,10 90,30 C 95,40 90,60 70,70"
+
+# BlenderBIM text has no id
+TEXT_SVG = """<svg xmlns="http://www.w3.org/2000/svg" width="100mm" height="100mm"
+ viewBox="0 0 100 100"><g class="IfcAnnotation"><text class="IfcAnnotation" x="10" y="20"
+ >Room</text><path class="IfcAnnotation" d="M 0,0 L 10,0"/></g></svg>"""
+
+
+def export(tmp_path, svg, *args):
+    path = tmp_path / "drawing.svg"
+    path.write_text(svg)
+    output = io.BytesIO()
+    DxfOutlines().run([*args, str(path)], output=output)
+    return output.getvalue().decode("latin_1")
+
+
+def lines(dxf):
+    """(x1, y1, x2, y2) of the LINE entities"""
+    tags = dxf.split("\n")
+    pairs = list(zip(tags[0::2], tags[1::2]))
+    found = []
+    for i, (code, value) in enumerate(pairs):
+        if code.strip() == "0" and value == "LINE":
+            entity = {}
+            for code, value in pairs[i + 1 :]:
+                if code.strip() == "0":
+                    break
+                entity[code.strip()] = value
+            found.append(tuple(float(entity[code]) for code in ("10", "20", "11", "21")))
+    return found
+
+
+def entity_tags(dxf, kind):
+    """(code, value) pairs of the first entity of a kind"""
+    tags = dxf.split("\n")
+    pairs = [(code.strip(), value) for code, value in zip(tags[0::2], tags[1::2])]
+    start = pairs.index(("0", kind)) + 1
+    end = next(i for i in range(start, len(pairs)) if pairs[i][0] == "0")
+    return pairs[start:end]
+
+
+def values(tags, *codes):
+    return [value for code, value in tags if code in codes]
+
+
+def tables(pairs):
+    """Table name -> (count of its 70 tag, records written)"""
+    found = {}
+    for i, pair in enumerate(pairs):
+        if pair == ("0", "TABLE"):
+            end = pairs.index(("0", "ENDTAB"), i)
+            table = pairs[i + 1 : end]
+            count = next(int(value) for code, value in table if code == "70")
+            found[table[0][1]] = (count, sum(code == "0" for code, _ in table))
+    return found
+
+
+def distance(x, y, segment):
+    x1, y1, x2, y2 = segment
+    dx, dy = x2 - x1, y2 - y1
+    u = max(0.0, min(1.0, ((x - x1) * dx + (y - y1) * dy) / ((dx * dx + dy * dy) or 1.0)))
+    return math.hypot(x - x1 - u * dx, y - y1 - u * dy)
+
+
+def test_flatness_in_mm_without_namedview(tmp_path):
+    dxf = export(tmp_path, MM_SVG, "--FLATTENBEZ=true", "--POLY=false", "--flatness=0.1")
+    segments = lines(dxf)
+    assert segments
+    p = [(0, 0), (100, 300), (300, -200), (400, 200)]
+    worst = 0.0
+    for i in range(2001):
+        u = i / 2000.0
+        w = ((1 - u) ** 3, 3 * (1 - u) ** 2 * u, 3 * (1 - u) * u * u, u**3)
+        # The y axis is flipped into the DXF coordinates
+        x = sum(wi * pi[0] for wi, pi in zip(w, p))
+        y = 400 - sum(wi * pi[1] for wi, pi in zip(w, p))
+        worst = max(worst, min(distance(x, y, s) for s in segments))
+    assert 0.05 < worst <= 0.1
+
+
+def text_to_path(svg):
+    """Stand-in for the Inkscape round trip of preprocess: text to a path, id kept"""
+    for text in svg.xpath("//svg:text"):
+        text.getparent().replace(text, PathElement.new("M 0,0 L 3,0 L 3,-2", id=text.get("id")))
+
+
+def test_cached_text_without_id(tmp_path, monkeypatch):
+    calls = []
+
+    def preprocess(self, types_to_path=None, unlink_clones=True):
+        calls.append(types_to_path)
+        text_to_path(self.svg)
+
+    monkeypatch.setattr(DxfOutlines, "preprocess", preprocess)
+    cache = "--cache_dir=%s" % (tmp_path / "cache")
+    first = export(tmp_path, TEXT_SVG, cache)
+    assert len(calls) == 1
+    assert len(list((tmp_path / "cache").iterdir())) == 1
+    second = export(tmp_path, TEXT_SVG, cache)
+    assert len(calls) == 1
+    assert len(list((tmp_path / "cache").iterdir())) == 1
+    assert lines(second) == lines(first)
+
+
+def banded(count, seed):
+    """Random pentadiagonal system as solve_banded rows, dense matrix and rhs"""
+    generator = numpy.random.default_rng(seed)
+    dense = numpy.zeros((count, count))
+    for offset in range(-min(2, count - 1), min(2, count - 1) + 1):
+        diagonal = generator.uniform(-1, 1, count - abs(offset))
+        dense += numpy.diag(diagonal, offset)
+    rhs = generator.uniform(-10, 10, (count, 2))
+    return dense, rhs
+
+
+def as_rows(dense):
+    return [{j: value for j, value in enumerate(row) if value} for row in dense]
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 6, 12, 200])
+def test_solve_banded_random(count):
+    for seed in range(20):
+        dense, rhs = banded(count, seed)
+        solution = solve_banded(as_rows(dense), rhs.tolist())
+        assert numpy.allclose(solution, numpy.linalg.solve(dense, rhs), rtol=1e-9, atol=1e-9)
+
+
+def test_solve_banded_near_singular():
+    # Tiny pivots on the diagonal, partial pivoting has to swap rows
+    dense, rhs = banded(30, 1)
+    dense[numpy.arange(30), numpy.arange(30)] = 1e-13
+    expected = numpy.linalg.solve(dense, rhs)
+    solution = numpy.array(solve_banded(as_rows(dense), rhs.tolist()))
+    assert numpy.allclose(dense @ solution, rhs, atol=1e-8)
+    assert numpy.allclose(solution, expected, rtol=1e-6, atol=1e-6)
+
+
+def test_solve_banded_singular():
+    dense, rhs = banded(8, 2)
+    dense[4] = dense[3]
+    with pytest.raises(LinAlgError):
+        solve_banded(as_rows(dense), rhs.tolist())
+
+
+# SPLINE of ROBO_SVG from the dense numpy.linalg.solve the banded solver replaced
+ROBO_BASELINE = {
+    "fits": [
+        "10.000000", "90.000000", "22.592593", "69.629630", "37.407407", "67.037037",
+        "50.000000", "80.000000", "62.592593", "90.740741", "77.407407", "85.925926",
+        "90.000000", "70.000000", "91.481481", "57.407407", "85.185185", "42.592593",
+        "70.000000", "30.000000",
+    ],
+    "controls": [
+        "10.000000", "90.000000", "12.833458", "81.997736", "17.446371", "68.969927",
+        "40.071234", "64.008969", "49.138321", "79.788450", "61.411026", "94.292145",
+        "80.031532", "85.871704", "90.484811", "73.013437", "92.701520", "56.110924",
+        "85.640115", "40.443460", "75.554032", "33.708625", "70.000000", "30.000000",
+    ],
+    "knots": [
+        "0.000000", "0.000000", "0.000000", "0.000000", "23.948390", "38.988346",
+        "57.060750", "73.611789", "89.189375", "109.492294", "122.171733", "138.269002",
+        "157.996223", "157.996223", "157.996223", "157.996223",
+    ],
+}
+ROBO_SINGLE_BASELINE = {
+    "fits": [
+        "10.000000", "90.000000", "22.592593", "69.629630", "37.407407", "67.037037",
+        "50.000000", "80.000000",
+    ],
+    "controls": [
+        "10.000000", "90.000000", "12.852272", "81.988977", "17.495815", "68.946910",
+        "39.946565", "64.067006", "46.450316", "74.374351", "50.000000", "80.000000",
+    ],
+    "knots": [
+        "0.000000", "0.000000", "0.000000", "0.000000", "23.948390", "38.988346",
+        "57.060750", "57.060750", "57.060750", "57.060750",
+    ],
+}
+
+
+@pytest.mark.parametrize(
+    "segments, baseline", [(ROBO_SEGMENTS, ROBO_BASELINE), ("", ROBO_SINGLE_BASELINE)]
+)
+def test_robo_spline_unchanged(tmp_path, segments, baseline):
+    spline = entity_tags(export(tmp_path, ROBO_SVG % segments, "--ROBO=true"), "SPLINE")
+    assert values(spline, "11", "21") == baseline["fits"]
+    assert values(spline, "10", "20") == baseline["controls"]
+    assert values(spline, "40") == baseline["knots"]
+
+
+def flat(*segments):
+    return [value for segment in segments for point in segment for value in point]
+
+
+def chained(chains):
+    """Segments of the chains, each as a sorted pair of end points"""
+    found = []
+    for points, closed in chains:
+        for a, b in zip(points, points[1:] + points[:closed]):
+            found.append(tuple(sorted((a, b))))
+    return sorted(found)
+
+
+def degrees(segments):
+    count = {}
+    for segment in segments:
+        for point in segment:
+            count[point] = count.get(point, 0) + 1
+    return count
+
+
+def test_chain_branches():
+    # A star of three arms around (0, 0), one arm two segments long, given
+    # out of order and in mixed directions
+    segments = [
+        ((0.0, 0.0), (1.0, 0.0)),
+        ((0.0, 2.0), (0.0, 1.0)),
+        ((-1.0, 0.0), (0.0, 0.0)),
+        ((0.0, 1.0), (0.0, 0.0)),
+    ]
+    chains = list(chain_segments(flat(*segments)))
+    assert chained(chains) == sorted(tuple(sorted(s)) for s in segments)
+    odd = {point for point, count in degrees(segments).items() if count % 2}
+    # Four odd nodes take two open chains, both starting and ending on them
+    assert len(chains) == 2
+    for points, closed in chains:
+        assert not closed
+        assert points[0] in odd and points[-1] in odd
+    # The long arm is not cut at (0, 1), which has an even degree
+    assert any((0.0, 1.0) in points[1:-1] for points, _ in chains)
+
+
+def test_chain_closed_loop():
+    square = [(0.0, 0.0), (4.0, 0.0), (4.0, 4.0), (0.0, 4.0)]
+    segments = [(square[i], square[(i + 1) % 4]) for i in (2, 0, 3, 1)]
+    # A fifth of the tolerance off, still the same corner
+    segments[3] = ((4.00002, 0.0), segments[3][1])
+    chains = list(chain_segments(flat(*segments)))
+    assert len(chains) == 1
+    points, closed = chains[0]
+    assert closed == 1
+    assert len(points) == 4  # the first point is not repeated
+    assert len(set(points)) == 4
+
+
+def test_chain_disconnected():
+    line = [((0.0, 0.0), (1.0, 0.0)), ((1.0, 0.0), (2.0, 1.0))]
+    triangle = [((5.0, 5.0), (6.0, 5.0)), ((6.0, 5.0), (5.0, 6.0)), ((5.0, 6.0), (5.0, 5.0))]
+    lone = [((9.0, 9.0), (9.0, 8.0))]
+    segments = triangle[:1] + line[:1] + lone + triangle[1:] + line[1:]
+    chains = list(chain_segments(flat(*segments)))
+    assert chained(chains) == sorted(tuple(sorted(s)) for s in segments)
+    # Open chains first, then the loops, each in order of their first segment
+    assert chains == [
+        ([(0.0, 0.0), (1.0, 0.0), (2.0, 1.0)], 0),
+        ([(9.0, 9.0), (9.0, 8.0)], 0),
+        ([(5.0, 5.0), (6.0, 5.0), (5.0, 6.0)], 1),
+    ]
+
+
+# Layers, text, a clone and curves, all with handles of their own
+HANDLES_SVG = """<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink"
+ width="100mm" height="100mm" viewBox="0 0 100 100">
+ <g class="IfcWall"><path class="IfcWall" id="wall" d="M 0,0 L 50,20 L 80,90 C 90,90 95,95 99,99"/>
+ <use xlink:href="#wall" x="5" y="5"/></g>
+ <g class="IfcDoor"><rect class="IfcDoor" x="10" y="10" width="20" height="30"/></g>
+ <g class="IfcAnnotation"><text class="IfcAnnotation" x="10" y="20">Room</text></g></svg>"""
+
+
+@pytest.mark.parametrize("args", [[], ["--POLY=true"], ["--ROBO=true"]])
+def test_header_follows_the_entities(tmp_path, monkeypatch, args):
+    monkeypatch.setattr(
+        DxfOutlines, "preprocess", lambda self, *args, **kwargs: text_to_path(self.svg)
+    )
+    tags = export(tmp_path, HANDLES_SVG, *args).split("\n")
+    pairs = [(code.strip(), value) for code, value in zip(tags[0::2], tags[1::2])]
+    # The handle is the first tag of every record, 105 on DIMSTYLE
+    handles = [
+        int(pairs[i + 1][1], 16)
+        for i, (code, _) in enumerate(pairs[:-1])
+        if code == "0" and pairs[i + 1][0] in ("5", "105")
+    ]
+    assert len(handles) == len(set(handles))
+    seed = pairs[pairs.index(("9", "$HANDSEED")) + 1]
+    assert seed[0] == "5"
+    assert int(seed[1], 16) > max(handles)
+    found = tables(pairs)
+    assert found["LAYER"] == (4, 4)  # 0 and the IfcClasses
+    for name, (count, records) in found.items():
+        assert count == records, name
@@ -0,0 +1,99 @@
+import io
+import re
+
+from inkex import Layer, load_svg
+from lxml import etree
+
+from ifc_layers import (
+    FINGERPRINT_ATTR,
+    class2layer,
+    export_layers,
+    get_global_ids,
+    stream_class2layer,
+)
+
+SVG = b"""<svg xmlns="http://www.w3.org/2000/svg"><g class="IfcWall">
+ <path class="IfcWall" d="M 0,0 L 10,0"/></g><rect class="IfcDoor" width="1" height="2"/></svg>"""
+
+
+def test_new_layers_are_layers():
+    svg = load_svg(SVG).getroot()
+    layers = class2layer(svg, fingerprinted=False)
+    assert list(layers) == ["IfcWall", "IfcDoor"]
+    # Looked up again, as the exporters find them in their traversal
+    for IfcClass in layers:
+        layer = svg.getElementById(IfcClass)
+        assert isinstance(layer, Layer)
+        assert layer.label == IfcClass
+    assert [element.get("class") for element in layers["IfcDoor"]] == ["IfcDoor"]
+
+
+def test_streamed_layers_use_the_inkscape_prefix():
+    output = io.BytesIO()
+    assert stream_class2layer(io.BytesIO(SVG), output) == {"IfcWall": 2, "IfcDoor": 1}
+    layered = output.getvalue()
+    assert not re.search(rb"\bns\d+:", layered)
+    assert layered.count(b'inkscape:groupmode="layer"') == 2
+    svg = load_svg(layered).getroot()
+    assert [layer.label for layer in svg if isinstance(layer, Layer)] == ["IfcWall", "IfcDoor"]
+
+
+def stream(source):
+    output = io.BytesIO()
+    counts = stream_class2layer(io.BytesIO(source), output)
+    return counts, output.getvalue()
+
+
+def test_stream_twice():
+    counts, first = stream(SVG)
+    again, second = stream(first)
+    assert again == counts
+    # The same document, spooled elements only repeat namespace declarations
+    assert etree.canonicalize(second.decode()) == etree.canonicalize(first.decode())
+    assert second.count(b'id="IfcWall"') == 1
+
+
+def test_stream_layered_document():
+    svg = load_svg(SVG).getroot()
+    class2layer(svg)
+    assert svg.get(FINGERPRINT_ATTR)
+    svg.append(load_svg(b'<rect xmlns="http://www.w3.org/2000/svg" class="IfcWindow"/>').getroot())
+    _, layered = stream(svg.tostring())
+    assert FINGERPRINT_ATTR.encode() not in layered
+    svg = load_svg(layered).getroot()
+    assert len(svg.xpath("//*[@id='IfcWall']")) == 1
+    # The in-memory class2layer finds the layers with their elements
+    layers = class2layer(svg)
+    assert {IfcClass: len(layer) for IfcClass, layer in layers.items()} == {
+        "IfcWall": 2,
+        "IfcDoor": 1,
+        "IfcWindow": 1,
+    }
+
+
+GUIDS = b"""<svg xmlns="http://www.w3.org/2000/svg" xmlns:ifc="http://www.ifcopenshell.org/ns">
+ <g class="IfcWall GlobalId-2O2Fr$t4X7Zf8NOew3FLOH 1ElFYt1QLB39HkvFCT0Kvz"><path d="M 0,0 L 1,0"/></g>
+ <g class="IfcWall GlobalId-1ITbXevTDDOwHP5qIvJx6o 1ElFYt1QLB39HkvFCT0Kvz"><path d="M 0,1 L 1,1"/></g>
+ <g class="IfcDoor" ifc:guid="0aUv$3sH18lvfrOl1BryXE"><rect width="1" height="2"/></g></svg>"""
+
+
+def test_global_ids_of_the_element_only():
+    svg = load_svg(GUIDS).getroot()
+    # The bare token is the GUID of the wall type, shared by both walls
+    assert [get_global_ids(group) for group in svg] == [
+        ["2O2Fr$t4X7Zf8NOew3FLOH"],
+        ["1ITbXevTDDOwHP5qIvJx6o"],
+        ["0aUv$3sH18lvfrOl1BryXE"],
+    ]
+
+
+def test_export_layers_selection():
+    walls = load_svg(GUIDS).getroot()[:2]
+    selection = "2O2Fr$t4X7Zf8NOew3FLOH, 1ElFYt1QLB39HkvFCT0Kvz"
+    layers, skipped, missing = export_layers(load_svg(GUIDS).getroot(), selection, "include")
+    assert list(layers) == ["IfcWall", "IfcDoor"]
+    assert sorted(element.get("class") for element in skipped) == ["IfcDoor", walls[1].get("class")]
+    assert missing == ["1ElFYt1QLB39HkvFCT0Kvz"]
+    layers, skipped, missing = export_layers(load_svg(GUIDS).getroot(), selection, "exclude")
+    assert [element.get("class") for element in skipped] == [walls[0].get("class")]
+    assert export_layers(load_svg(GUIDS).getroot(), selection, "all")[1:] == (set(), [])